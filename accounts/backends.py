@@ -0,0 +1,24 @@
+"""
+Authentication backend that loads the role profile together with the user
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .models import ROLE_PROFILE_RELATIONS
+
+UserModel = get_user_model()
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() joins the role profile tables, so
+    request.user.donor_profile (etc.) costs no extra query per request
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related(
+                *ROLE_PROFILE_RELATIONS.values()
+            ).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
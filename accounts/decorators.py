@@ -4,11 +4,13 @@ Role-Based Access Control (RBAC) Decorators
 from functools import wraps
 from django.shortcuts import redirect
 from django.contrib import messages
+from .signals import create_role_profile
 
 
 def role_required(allowed_roles):
     """
     Decorator to restrict access based on user role
+    Also sets request.profile to the user's role profile
     
     Usage:
         @role_required(['donor'])
@@ -33,6 +35,13 @@ def role_required(allowed_roles):
                     return redirect('patients:dashboard')
                 return redirect('accounts:home')
             
+            # Role profile (already joined into the user query by
+            # ProfileModelBackend), so views don't fetch it again
+            request.profile = request.user.get_role_profile()
+            if request.profile is None:
+                # Role changed, or the account predates its profile row
+                request.profile = create_role_profile(request.user)
+
             return view_func(request, *args, **kwargs)
         return wrapped_view
     return decorator
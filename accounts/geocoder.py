@@ -0,0 +1,225 @@
+"""
+Offline geocoding from a bundled gazetteer
+
+Registration used to ask Nominatim / bigdatacloud from the browser to turn a
+place name into coordinates and back. This answers both from a gazetteer
+file loaded once per process, on first use:
+
+    search(query)        places whose name (or any word of it) starts with
+                         query, biggest first; close misspellings as fallback
+    reverse(lat, lon)    nearest place within MAX_DISTANCE_KM, or None
+
+Reverse lookups use a grid index (places bucketed by CELL_DEGREES cells),
+scanning rings of cells outward from the query point until no unvisited
+cell can hold anything closer.
+
+The bundled accounts/data/gazetteer.csv covers Indian cities and the towns
+of Andhra Pradesh and Telangana. A bigger one can be dropped in: either the
+same CSV columns (name,state,country,latitude,longitude,population) or a
+GeoNames dump such as cities1000.txt (tab separated, detected by extension).
+
+Settings (all optional):
+    GEOCODER = {
+        'GAZETTEER': '/path/to/cities1000.txt',
+        'CELL_DEGREES': 0.5,      # grid cell size of the reverse index
+        'MAX_DISTANCE_KM': 50,    # reverse lookups farther than this return None
+        'MAX_RESULTS': 8,         # cap on search results
+    }
+"""
+import bisect
+import csv
+import difflib
+import math
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+from django.conf import settings
+
+from .utils import haversine_distance
+
+
+DEFAULTS = {
+    'GAZETTEER': Path(__file__).resolve().parent / 'data' / 'gazetteer.csv',
+    'CELL_DEGREES': 0.5,
+    'MAX_DISTANCE_KM': 50,
+    'MAX_RESULTS': 8,
+}
+
+KM_PER_DEGREE = 111.32
+
+# Columns of a GeoNames dump (geoname_id, name, asciiname, ..., population, ...)
+GEONAMES_COLUMNS = {'name': 1, 'latitude': 4, 'longitude': 5, 'country': 8, 'state': 10, 'population': 14}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'GEOCODER', {}))
+
+
+def normalize(text):
+    """Lowercase ASCII words separated by single spaces"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def read_gazetteer(path):
+    """Rows of (name, state, country, latitude, longitude, population)"""
+    path = Path(path)
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.suffix == '.txt':
+            for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                yield tuple(row[GEONAMES_COLUMNS[key]] for key in
+                            ('name', 'state', 'country', 'latitude', 'longitude', 'population'))
+        else:
+            for row in csv.DictReader(f):
+                yield (row['name'], row['state'], row['country'],
+                       row['latitude'], row['longitude'], row['population'])
+
+
+class Geocoder:
+    """Name and grid indexes over one gazetteer, built in the constructor"""
+
+    def __init__(self, rows, cell_degrees=0.5, max_distance_km=50, max_results=8):
+        self.cell_degrees = cell_degrees
+        self.max_distance_km = max_distance_km
+        self.max_results = max_results
+        self.lon_cells = math.ceil(360 / cell_degrees)
+
+        self.places = []
+        self.grid = {}
+        # Sorted (key, place index) pairs; each place is listed under its
+        # full name and under every later word, so "mumbai" finds "Navi Mumbai"
+        self.prefixes = []
+        # First letter -> normalized names, for the fuzzy fallback
+        self.names_by_initial = {}
+        self.places_by_name = {}
+
+        for name, state, country, latitude, longitude, population in rows:
+            key = normalize(name)
+            if not key:
+                continue
+            index = len(self.places)
+            latitude, longitude = float(latitude), float(longitude)
+            self.places.append({
+                'name': name,
+                'state': state,
+                'country': country,
+                'latitude': latitude,
+                'longitude': longitude,
+                'population': int(population or 0),
+            })
+            self.grid.setdefault(self.cell(latitude, longitude), []).append(index)
+
+            words = key.split(' ')
+            for position in range(len(words)):
+                self.prefixes.append((' '.join(words[position:]), index))
+            self.places_by_name.setdefault(key, []).append(index)
+            self.names_by_initial.setdefault(key[0], set()).add(key)
+
+        self.prefixes.sort()
+        self.prefix_keys = [key for key, _ in self.prefixes]
+
+    def cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees) % self.lon_cells,
+        )
+
+    def result(self, index, distance_km=None):
+        place = self.places[index]
+        result = {
+            'name': place['name'],
+            'display_name': ', '.join(part for part in (place['name'], place['state']) if part),
+            'latitude': place['latitude'],
+            'longitude': place['longitude'],
+        }
+        if distance_km is not None:
+            result['distance_km'] = round(distance_km, 2)
+        return result
+
+    def search(self, query, limit=None):
+        """Places matching query: exact, then prefix matches, then near misses"""
+        limit = min(limit or self.max_results, self.max_results)
+        query = normalize(query)
+        if not query:
+            return []
+
+        matches = {}
+        start = bisect.bisect_left(self.prefix_keys, query)
+        for key, index in self.prefixes[start:]:
+            if not key.startswith(query):
+                break
+            full_name = normalize(self.places[index]['name'])
+            rank = 0 if full_name == query else 1 if full_name.startswith(query) else 2
+            matches[index] = min(rank, matches.get(index, rank))
+
+        if len(matches) < limit:
+            close = difflib.get_close_matches(
+                query, self.names_by_initial.get(query[0], ()), n=limit, cutoff=0.75
+            )
+            for name in close:
+                for index in self.places_by_name[name]:
+                    matches.setdefault(index, 3)
+
+        ranked = sorted(matches, key=lambda index: (matches[index], -self.places[index]['population']))
+        return [self.result(index) for index in ranked[:limit]]
+
+    def reverse(self, latitude, longitude):
+        """Nearest place within max_distance_km of the point, or None"""
+        row, column = self.cell(latitude, longitude)
+        # Longitude cells narrow towards the poles; use the narrowest in reach
+        edge_latitude = min(abs(latitude) + self.max_distance_km / KM_PER_DEGREE, 89.9)
+        cell_km = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(edge_latitude))
+
+        best, best_distance = None, None
+        ring = 0
+        while True:
+            for cell in self.ring_cells(row, column, ring):
+                for index in self.grid.get(cell, ()):
+                    place = self.places[index]
+                    distance = haversine_distance(latitude, longitude, place['latitude'], place['longitude'])
+                    if best_distance is None or distance < best_distance:
+                        best, best_distance = index, distance
+            # Every cell outside this ring is at least ring * cell_km away
+            reach = ring * cell_km
+            if best_distance is not None and best_distance <= reach:
+                break
+            if reach > self.max_distance_km or ring > self.lon_cells:
+                break
+            ring += 1
+
+        if best is None or best_distance > self.max_distance_km:
+            return None
+        return self.result(best, best_distance)
+
+    def ring_cells(self, row, column, ring):
+        """Cells at exactly ring steps (Chebyshev distance) from (row, column)"""
+        if ring == 0:
+            return [(row, column)]
+        cells = []
+        for d_row in range(-ring, ring + 1):
+            step = 1 if abs(d_row) == ring else 2 * ring
+            for d_column in range(-ring, ring + 1, step):
+                cells.append((row + d_row, (column + d_column) % self.lon_cells))
+        return cells
+
+
+_geocoder = None
+_lock = threading.Lock()
+
+
+def get_geocoder():
+    """The process-wide Geocoder, loading the gazetteer on first use"""
+    global _geocoder
+    if _geocoder is None:
+        with _lock:
+            if _geocoder is None:
+                config = get_config()
+                _geocoder = Geocoder(
+                    read_gazetteer(config['GAZETTEER']),
+                    cell_degrees=config['CELL_DEGREES'],
+                    max_distance_km=config['MAX_DISTANCE_KM'],
+                    max_results=config['MAX_RESULTS'],
+                )
+    return _geocoder
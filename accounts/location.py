@@ -0,0 +1,94 @@
+"""
+Coalesced location updates for users on the move
+
+Browsers report positions far more often than a donor actually goes
+anywhere. A report is written only when it is more than MIN_DISTANCE_KM
+from the stored position, and at most once per MIN_INTERVAL seconds per
+user; everything else is acknowledged without touching the database.
+A written report is one narrow UPDATE of the location columns, with the
+place name from the offline geocoder.
+
+Nearby searches (accounts.utils.get_nearby_users) read the location
+columns directly, so there is no derived index or cache to refresh.
+
+Settings (all optional):
+    LOCATION_UPDATES = {
+        'MIN_DISTANCE_KM': 0.5,   # smaller moves are not written
+        'MIN_INTERVAL': 60,       # seconds between writes for one user
+    }
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .geocoder import get_geocoder
+from .utils import haversine_distance
+
+
+DEFAULTS = {
+    'MIN_DISTANCE_KM': 0.5,
+    'MIN_INTERVAL': 60,
+}
+
+LOCATION_FIELDS = ['latitude', 'longitude', 'location_name', 'updated_at']
+
+# Process-wide counters
+metrics = {
+    'updates_received': 0,
+    'updates_written': 0,
+    'updates_unmoved': 0,
+    'updates_throttled': 0,
+}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'LOCATION_UPDATES', {}))
+
+
+def stats():
+    """Snapshot of the location update counters"""
+    return dict(metrics)
+
+
+def throttle_key(user_id):
+    return f'location:written:{user_id}'
+
+
+def place_name(latitude, longitude):
+    """Nearest known place, or the coordinates when nothing is close"""
+    place = get_geocoder().reverse(latitude, longitude)
+    if place is None:
+        return f'{latitude:.4f}, {longitude:.4f}'
+    return place['display_name']
+
+
+def update_location(user, latitude, longitude):
+    """
+    Record a reported position for user (a loaded User instance).
+    Returns (written, reason) where reason is 'moved', 'first',
+    'unmoved' or 'throttled'.
+    """
+    config = get_config()
+    metrics['updates_received'] += 1
+
+    if user.latitude is not None and user.longitude is not None:
+        distance = haversine_distance(user.latitude, user.longitude, latitude, longitude)
+        if distance < config['MIN_DISTANCE_KM']:
+            metrics['updates_unmoved'] += 1
+            return False, 'unmoved'
+        reason = 'moved'
+    else:
+        reason = 'first'
+
+    # cache.add is atomic, so concurrent reports from several tabs or
+    # workers still produce at most one write per interval
+    if not cache.add(throttle_key(user.id), 1, config['MIN_INTERVAL']):
+        metrics['updates_throttled'] += 1
+        return False, 'throttled'
+
+    user.latitude = round(latitude, 6)
+    user.longitude = round(longitude, 6)
+    user.location_name = place_name(latitude, longitude)
+    user.save(update_fields=LOCATION_FIELDS)
+
+    metrics['updates_written'] += 1
+    return True, reason
@@ -0,0 +1,179 @@
+"""
+Management command: fail if a hot view query falls back to a full table scan
+
+Requests the busiest pages with the test client, the same requests
+check_view_budgets makes (plus the next page of the paginated ones and
+the expire_schedules command), captures every SELECT the views
+themselves issue and asks the database for its plan:
+
+    SQLite       EXPLAIN QUERY PLAN; "SCAN <table>" is a full scan
+    PostgreSQL   EXPLAIN with enable_seqscan off; a "Seq Scan" that
+                 survives that means no index can serve the query
+
+The queries run in a temporary test database built from the migrations
+and seeded with a small dataset, so the views have rows to work on.
+Plans depend on the schema, not the data. Exits non-zero when any query
+scans a table, which makes it usable as a pre-deploy check.
+
+Usage:
+    python manage.py check_query_plans
+    python manage.py check_query_plans -v 2      # print every plan
+"""
+import io
+import os
+import random
+import re
+import shutil
+import tempfile
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.management.commands.check_view_budgets import requests_for, seed
+from accounts.pagination import encode_cursor
+
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# Django aliases tables in subqueries and repeated joins ("donors_donorprofile" U0)
+TABLE_ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]+\d+)\b')
+
+# SQLite reports these as SCAN too; they are not tables
+NOT_TABLES = {'CONSTANT'}
+
+# Pages checked, by URL name; the paginated ones are also requested with a cursor
+HOT_VIEWS = [
+    'donors:dashboard',
+    'donors:schedule_donation',
+    'donors:donation_history',
+    'bloodbanks:dashboard',
+    'bloodbanks:scheduled_donors',
+    'patients:search',
+    'chat:chat_list',
+    'chat:chat_history',
+]
+PAGINATED_VIEWS = {'donors:donation_history', 'bloodbanks:scheduled_donors', 'chat:chat_history'}
+
+
+def hot_requests(data):
+    """(page, description, role, path) for each hot page request"""
+    cursor = urlencode({'cursor': encode_cursor(timezone.now(), 1)})
+    requests = []
+    for name, role, method, path, _ in requests_for(data):
+        if name not in HOT_VIEWS or method != 'get':
+            continue
+        requests.append((name, 'first page', role, path))
+        if name in PAGINATED_VIEWS:
+            separator = '&' if '?' in path else '?'
+            requests.append((name, 'next page', role, f'{path}{separator}{cursor}'))
+    return requests
+
+
+def explain(sql):
+    """Plan lines for one captured statement"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [row[0] for row in cursor.fetchall()]
+
+
+def scanned_tables(sql, plan):
+    """Tables read in full according to the plan of sql"""
+    pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+    tables = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) not in NOT_TABLES:
+            tables.append(aliases.get(match.group(1), match.group(1)))
+    return tables
+
+
+class Command(BaseCommand):
+    help = "Check that the hot view queries are served by indexes (no full table scans)"
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plans can't be checked on {connection.vendor}")
+
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.mkdtemp(prefix='query_plans_')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'plans.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            failures = self.check_plans(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        if failures:
+            raise CommandError(f"{failures} hot quer{'y' if failures == 1 else 'ies'} without a usable index")
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes"))
+
+    def check_plans(self, options):
+        """Run every hot request and report its plans; returns the number of failures"""
+        failures = 0
+        with transaction.atomic():
+            data = seed(1, random.Random(1))
+            clients = {}
+            for role in ('donor', 'new_donor', 'bank', 'patient'):
+                clients[role] = Client()
+                clients[role].force_login(data[role])
+
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            checks = [
+                (page, description, lambda role=role, path=path: clients[role].get(path))
+                for page, description, role, path in hot_requests(data)
+            ]
+            checks.append(('expire_schedules', 'past-due schedules', lambda: call_command(
+                'expire_schedules', stdout=io.StringIO()
+            )))
+
+            for page, description, run in checks:
+                # Cached fragments would hide the queries behind them
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    response = run()
+
+                statements = [
+                    query['sql'] for query in captured.captured_queries
+                    if query['sql'].lstrip().upper().startswith('SELECT')
+                ]
+                plans = [explain(sql) for sql in statements]
+                scans = [
+                    table for sql, plan in zip(statements, plans)
+                    for table in scanned_tables(sql, plan)
+                ]
+                # A view that errors out never ran the rest of its queries
+                error = response is not None and response.status_code >= 400
+                if scans or error:
+                    failures += 1
+
+                status = self.style.ERROR('FAIL') if scans or error else self.style.SUCCESS('ok  ')
+                detail = f"  (full scan of {', '.join(sorted(set(scans)))})" if scans else ''
+                if error:
+                    detail += f"  (HTTP {response.status_code})"
+                self.stdout.write(f"{status}  {page}: {description}{detail}")
+                if scans or options['verbosity'] >= 2:
+                    for sql, plan in zip(statements, plans):
+                        if options['verbosity'] >= 2 or scanned_tables(sql, plan):
+                            self.stdout.write(f"      {sql}")
+                            for line in plan:
+                                self.stdout.write(f"        {line}")
+
+            transaction.set_rollback(True)
+        return failures
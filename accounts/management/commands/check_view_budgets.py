@@ -0,0 +1,408 @@
+"""
+Management command: per-view query-count budgets and latency report
+
+Seeds a realistic dataset into a temporary test database and requests
+every page of accounts, donors, bloodbanks, patients and chat with the
+test client, twice over: once with the base dataset and once with it
+scaled up. For each view it checks that
+
+    - the number of queries stays within the view's budget (VIEW_BUDGETS)
+    - the number of queries does not grow with the data (an N+1)
+    - the median wall time has not regressed past the stored baseline
+
+Each request runs in a rolled-back transaction with an empty cache, so
+POST views can be repeated and every measurement sees the same cold
+state. Form submissions are listed as '<view> (POST)' next to the page
+itself. Passwords are hashed with a fast hasher during the run, so login
+and registration times measure the views rather than PBKDF2. Exits
+non-zero on any failure.
+
+Budgets are deliberately tight; when a view really needs another query,
+raise its budget in the same change.
+
+Usage:
+    python manage.py check_view_budgets
+    python manage.py check_view_budgets --scale 5 --repeat 9 --output report.json
+    python manage.py check_view_budgets --update-baseline   # after an intended change
+"""
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'perf', 'view_baseline.json')
+
+# Maximum queries per request, including session and user lookups
+VIEW_BUDGETS = {
+    'accounts:home': 0,
+    'accounts:login': 0,
+    'accounts:login (POST)': 5,
+    'accounts:register': 0,
+    'accounts:register (POST)': 10,
+    'accounts:login_redirect': 2,
+    'accounts:geocode_search': 0,
+    'accounts:geocode_reverse': 0,
+    'accounts:location_update': 3,
+    'donors:dashboard': 4,
+    'donors:profile': 2,
+    'donors:toggle_availability': 3,
+    'donors:schedule_donation': 5,
+    'donors:schedule_donation (POST)': 9,
+    'donors:donation_history': 3,
+    'donors:cancel_donation': 6,
+    'donors:cancel_donation (POST)': 6,
+    'bloodbanks:dashboard': 6,
+    'bloodbanks:manage_inventory': 3,
+    'bloodbanks:scheduled_donors': 4,
+    'bloodbanks:mark_completed': 9,
+    'bloodbanks:mark_completed_bulk': 7,
+    'bloodbanks:profile': 2,
+    'patients:dashboard': 2,
+    'patients:search': 5,
+    'patients:profile': 2,
+    'chat:chat_list': 3,
+    'chat:chat_room': 6,
+    'chat:chat_history': 4,
+    'chat:chat_search': 5,
+}
+
+CENTER = (16.5062, 80.6480)
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+SAMPLE_MESSAGES = [
+    'Is O+ blood available at your bank today?',
+    'Yes, we have enough units in stock.',
+    'Can I come for a donation tomorrow morning?',
+    'Sure, please bring an ID proof.',
+]
+
+# Password of the budget_donor user, for the login form
+PASSWORD = 'budget-password'
+
+
+def nearby(rng, spread=0.3):
+    return round(CENTER[0] + rng.uniform(-spread, spread), 6), round(CENTER[1] + rng.uniform(-spread, spread), 6)
+
+
+def seed(scale, rng):
+    """
+    Create the dataset for one run; returns the users and objects the
+    requests are made as / about. Everything grows linearly with scale.
+    """
+    from django.contrib.auth.hashers import make_password
+    from accounts.models import User
+    from bloodbanks.models import BloodBank, BloodInventory
+    from chat.models import ChatRoom, Message
+    from donors.models import DonationSchedule, DonorProfile
+    from patients.models import PatientProfile
+
+    now = timezone.now()
+    roles = (['donor'] * 40 + ['bloodbank'] * 5 + ['patient'] * 5) * scale
+    subjects = ['budget_donor', 'budget_new_donor', 'budget_bank', 'budget_patient']
+    subject_roles = ['donor', 'donor', 'bloodbank', 'patient']
+
+    users = User.objects.bulk_create([
+        User(
+            username=username,
+            email=f'{username}@budget.invalid',
+            role=role,
+            password=make_password(PASSWORD) if username == 'budget_donor' else '!',
+            latitude=CENTER[0] if username in subjects else nearby(rng)[0],
+            longitude=CENTER[1] if username in subjects else nearby(rng)[1],
+            location_name='Vijayawada, Andhra Pradesh',
+        )
+        for username, role in zip(
+            subjects + [f'budget_{index}' for index in range(len(roles))],
+            subject_roles + roles,
+        )
+    ])
+    by_role = {}
+    for user in users:
+        by_role.setdefault(user.role, []).append(user)
+
+    donors = DonorProfile.objects.bulk_create([
+        DonorProfile(user=user, blood_group=BLOOD_GROUPS[index % 8], age=30, phone_number='9999999999')
+        for index, user in enumerate(by_role['donor'])
+    ])
+    banks = BloodBank.objects.bulk_create([
+        BloodBank(user=user, name=f'{user.username} blood bank', address='Vijayawada', contact_number='9999999999')
+        for user in by_role['bloodbank']
+    ])
+    PatientProfile.objects.bulk_create([
+        PatientProfile(user=user, phone_number='9999999999', age=40, blood_group='O+')
+        for user in by_role['patient']
+    ])
+    BloodInventory.objects.bulk_create([
+        BloodInventory(blood_bank=bank, blood_group=group, units=rng.randint(15, 40))
+        for bank in banks for group in BLOOD_GROUPS
+    ])
+
+    donor, new_donor, others = donors[0], donors[1], donors[2:]
+    bank = banks[0]
+    schedules = []
+    for index in range(20 * scale):
+        schedules.append(DonationSchedule(
+            donor=rng.choice(others), blood_bank=bank, status='scheduled',
+            scheduled_date=now + timedelta(hours=rng.randint(1, 24 * 14)),
+        ))
+        schedules.append(DonationSchedule(
+            donor=rng.choice(others), blood_bank=bank, status='completed',
+            scheduled_date=now - timedelta(days=rng.randint(1, 365)),
+        ))
+        schedules.append(DonationSchedule(
+            donor=donor, blood_bank=rng.choice(banks), status='completed',
+            scheduled_date=now - timedelta(days=100 + index),
+        ))
+    schedules.append(DonationSchedule(
+        donor=donor, blood_bank=bank, status='scheduled', scheduled_date=now + timedelta(days=2),
+    ))
+    # bulk_create skips save(), so nothing else happens per row
+    schedules = DonationSchedule.objects.bulk_create(schedules)
+    DonorProfile.objects.filter(id=donor.id).update(last_donation_date=date.today() - timedelta(days=100))
+
+    # Conversations of the patient with donors and banks
+    patient = by_role['patient'][0]
+    partners = by_role['donor'][2:2 + 5 * scale] + by_role['bloodbank'][:scale]
+    rooms = ChatRoom.objects.bulk_create([ChatRoom(participant1=patient, participant2=partner) for partner in partners])
+    Message.objects.bulk_create([
+        Message(
+            room=room,
+            sender=patient if turn % 2 else room.participant2,
+            receiver=room.participant2 if turn % 2 else patient,
+            content=rng.choice(SAMPLE_MESSAGES),
+        )
+        for room in rooms for turn in range(60 * scale)
+    ])
+    for room in rooms:
+        last = Message.objects.filter(room=room).order_by('-id').first()
+        ChatRoom.objects.filter(id=room.id).update(
+            last_message=last, last_message_preview=last.content[:255],
+            last_message_at=last.timestamp, participant1_unread=3,
+        )
+
+    return {
+        'donor': by_role['donor'][0],
+        'new_donor': by_role['donor'][1],
+        'bank': by_role['bloodbank'][0],
+        'blood_bank': bank,
+        'patient': patient,
+        'partner': partners[0],
+        'room': rooms[0],
+        'donor_schedule': schedules[-1],
+        'bank_schedules': [schedule for schedule in schedules if schedule.blood_bank_id == bank.id
+                           and schedule.status == 'scheduled'][:5],
+    }
+
+
+def requests_for(data):
+    """(view name, user or None, method, path, POST data) for every view"""
+    bank_schedule_ids = [schedule.id for schedule in data['bank_schedules']]
+    scheduled_date = timezone.localtime(timezone.now() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M')
+    return [
+        ('accounts:home', None, 'get', '/', None),
+        ('accounts:login', None, 'get', '/login/', None),
+        ('accounts:login (POST)', None, 'post', '/login/',
+         {'role': 'donor', 'username': data['donor'].username, 'password': PASSWORD}),
+        ('accounts:register', None, 'get', '/register/', None),
+        ('accounts:register (POST)', None, 'post', '/register/', {
+            'username': 'budget_registered', 'first_name': 'Budget', 'last_name': 'Donor',
+            'email': 'budget_registered@budget.invalid', 'role': 'donor',
+            'password1': 'Budget-pass-7391', 'password2': 'Budget-pass-7391',
+            'latitude': CENTER[0], 'longitude': CENTER[1], 'location_name': 'Vijayawada, Andhra Pradesh',
+        }),
+        ('accounts:login_redirect', 'donor', 'get', '/redirect/', None),
+        ('accounts:geocode_search', None, 'get', '/geocode/search/?q=vija', None),
+        ('accounts:geocode_reverse', None, 'get', '/geocode/reverse/?lat=16.51&lon=80.63', None),
+        ('accounts:location_update', 'donor', 'post', '/location/', {'latitude': 16.7, 'longitude': 80.9}),
+        ('donors:dashboard', 'donor', 'get', '/donor/dashboard/', None),
+        ('donors:profile', 'donor', 'get', '/donor/profile/', None),
+        ('donors:toggle_availability', 'donor', 'get', '/donor/toggle-availability/', None),
+        ('donors:schedule_donation', 'new_donor', 'get', '/donor/schedule/', None),
+        ('donors:schedule_donation (POST)', 'new_donor', 'post', '/donor/schedule/',
+         {'blood_bank': data['blood_bank'].id, 'scheduled_date': scheduled_date}),
+        ('donors:donation_history', 'donor', 'get', '/donor/history/', None),
+        ('donors:cancel_donation', 'donor', 'get', f"/donor/cancel/{data['donor_schedule'].id}/", None),
+        ('donors:cancel_donation (POST)', 'donor', 'post', f"/donor/cancel/{data['donor_schedule'].id}/", {}),
+        ('bloodbanks:dashboard', 'bank', 'get', '/bloodbank/dashboard/', None),
+        ('bloodbanks:manage_inventory', 'bank', 'get', '/bloodbank/inventory/', None),
+        ('bloodbanks:scheduled_donors', 'bank', 'get', '/bloodbank/scheduled-donors/', None),
+        ('bloodbanks:mark_completed', 'bank', 'get', f'/bloodbank/mark-completed/{bank_schedule_ids[0]}/', None),
+        ('bloodbanks:mark_completed_bulk', 'bank', 'post', '/bloodbank/mark-completed/bulk/',
+         {'schedule_ids': bank_schedule_ids}),
+        ('bloodbanks:profile', 'bank', 'get', '/bloodbank/profile/', None),
+        ('patients:dashboard', 'patient', 'get', '/patient/dashboard/', None),
+        ('patients:search', 'patient', 'get', '/patient/search/?blood_group=O%2B&max_distance=100', None),
+        ('patients:profile', 'patient', 'get', '/patient/profile/', None),
+        ('chat:chat_list', 'patient', 'get', '/chat/', None),
+        ('chat:chat_room', 'patient', 'get', f"/chat/room/{data['partner'].id}/", None),
+        ('chat:chat_history', 'patient', 'get', f"/chat/history/{data['room'].id}/", None),
+        ('chat:chat_search', 'patient', 'get', '/chat/search/?q=blood', None),
+    ]
+
+
+def measure(clients, request, repeat):
+    """(queries, median ms, status code) of one request repeated"""
+    name, user, method, path, data = request
+    timings = []
+    queries = 0
+    status = None
+    for _ in range(repeat):
+        # Anonymous requests get a new client, so a login or registration
+        # does not carry its session into the next repetition
+        client = clients[user] if user else Client()
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data) if data else getattr(client, method)(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            # Savepoints are bookkeeping of this harness, not of the view
+            queries = max(queries, sum(
+                1 for query in captured.captured_queries if 'SAVEPOINT' not in query['sql']
+            ))
+            status = response.status_code
+            transaction.set_rollback(True)
+    return queries, round(statistics.median(timings), 2), status
+
+
+class Command(BaseCommand):
+    help = "Check per-view query budgets on seeded data and compare view latency with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=4,
+                            help='Size of the larger dataset relative to the base one (default: 4)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Requests per view; the median time is reported (default: 5)')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                            help='Baseline JSON file (default: perf/view_baseline.json)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=1.0,
+                            help='Allowed slowdown over the baseline as a fraction (default: 1.0, i.e. 2x)')
+        parser.add_argument('--slack-ms', type=float, default=5.0,
+                            help='Extra milliseconds always allowed over the baseline (default: 5)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 2:
+            raise CommandError("--scale must be at least 2 to compare dataset sizes")
+
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.mkdtemp(prefix='view_budgets_')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'budgets.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                small = self.run_scale(1, options)
+                large = self.run_scale(options['scale'], options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['views']
+
+        report = self.build_report(small, large, baseline, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['update_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as f:
+                json.dump({
+                    'scale': options['scale'],
+                    'views': {
+                        name: {'queries': view['queries'], 'ms': view['ms']}
+                        for name, view in report['views'].items()
+                    },
+                }, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+
+        self.print_report(report)
+        if report['failures'] and not options['update_baseline']:
+            raise CommandError(f"{len(report['failures'])} view budget check(s) failed")
+
+    def run_scale(self, scale, options):
+        """Seed a dataset of the given scale, measure every view, roll it all back"""
+        results = {}
+        with transaction.atomic():
+            data = seed(scale, random.Random(scale))
+            clients = {}
+            for role in ('donor', 'new_donor', 'bank', 'patient'):
+                clients[role] = Client()
+                clients[role].force_login(data[role])
+
+            for request in requests_for(data):
+                results[request[0]] = measure(clients, request, options['repeat'])
+            transaction.set_rollback(True)
+        return results
+
+    def build_report(self, small, large, baseline, options):
+        views = {}
+        failures = []
+        for name, (queries, ms, status) in large.items():
+            small_queries = small[name][0]
+            budget = VIEW_BUDGETS.get(name)
+            view = {
+                'status': status,
+                'queries': queries,
+                'queries_base_data': small_queries,
+                'budget': budget,
+                'ms': ms,
+                'ms_base_data': small[name][1],
+            }
+            if status >= 400:
+                failures.append(f"{name}: HTTP {status}")
+            if budget is None:
+                failures.append(f"{name}: no query budget set")
+            elif queries > budget:
+                failures.append(f"{name}: {queries} queries, budget is {budget}")
+            if queries != small_queries:
+                failures.append(f"{name}: queries grow with data ({small_queries} -> {queries})")
+
+            if name in baseline:
+                view['baseline_ms'] = baseline[name]['ms']
+                allowed = baseline[name]['ms'] * (1 + options['tolerance']) + options['slack_ms']
+                if ms > allowed:
+                    failures.append(f"{name}: {ms}ms, baseline {baseline[name]['ms']}ms (allowed {allowed:.1f}ms)")
+            views[name] = view
+
+        return {
+            'scale': options['scale'],
+            'repeat': options['repeat'],
+            'views': views,
+            'failures': failures,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"  {'view':<32} {'queries':>7} {'budget':>6} {'ms':>8} {'baseline':>9}"
+        )
+        for name, view in report['views'].items():
+            baseline = view.get('baseline_ms', '-')
+            budget = '-' if view['budget'] is None else view['budget']
+            self.stdout.write(
+                f"  {name:<32} {view['queries']:>7} {budget:>6} {view['ms']:>8} {baseline:>9}"
+            )
+        for failure in report['failures']:
+            self.stdout.write(self.style.ERROR(f"FAIL  {failure}"))
+        if not report['failures']:
+            self.stdout.write(self.style.SUCCESS("All views within budget"))
@@ -0,0 +1,332 @@
+"""
+Management command: bulk-import users from a CSV file
+
+Users are inserted with bulk_create in batches instead of one save() per
+row, so accounts.signals.create_user_profile never fires; the matching
+DonorProfile / BloodBank / PatientProfile rows (with the same defaults the
+signal uses) are bulk-created in the same transaction as their users.
+Passwords are hashed in a process pool while earlier batches are written.
+
+CSV columns (header row required):
+    username, email, role               required; role is donor, bloodbank or patient
+    password                            empty gives an unusable password (reset by email)
+    first_name, last_name
+    latitude, longitude, location_name  location_name defaults to the nearest known place
+    blood_group, age, phone_number      donor / patient profile
+    name, address                       blood bank name (default: username) and address
+
+Rows with missing or invalid fields, or whose username or email already
+exists (in the database or earlier in the file), are skipped and counted.
+
+PBKDF2 at Django's default strength costs ~0.2s of CPU per password, so
+hashing dominates big imports. --hash-iterations stores cheaper hashes,
+which Django re-hashes at full strength on each user's first login.
+
+Usage:
+    python manage.py import_users users.csv
+    python manage.py import_users users.csv --workers 8 --batch-size 2000
+    python manage.py import_users users.csv --hash-iterations 20000 --dry-run
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.location import place_name
+from accounts.models import User
+from bloodbanks.models import BloodBank
+from donors.models import DonorProfile
+from patients.models import PatientProfile
+
+
+# Passwords per task handed to a worker; small enough to keep workers evenly loaded
+HASH_CHUNK = 50
+
+# Existing usernames / emails are looked up this many at a time
+LOOKUP_CHUNK = 500
+
+ROLES = {role for role, _ in User.ROLE_CHOICES}
+BLOOD_GROUPS = {group for group, _ in DonorProfile.BLOOD_GROUP_CHOICES}
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def hash_passwords(passwords, iterations=None):
+    """
+    Hash a chunk of passwords (runs in a worker process).
+    Returns (hashes, seconds spent).
+    """
+    started = time.perf_counter()
+    hasher = get_hasher()
+    hashes = []
+    for password in passwords:
+        if not password:
+            hashes.append(make_password(None))
+        elif iterations:
+            hashes.append(hasher.encode(password, hasher.salt(), iterations))
+        else:
+            hashes.append(make_password(password))
+    return hashes, time.perf_counter() - started
+
+
+def parse_row(row):
+    """Cleaned fields of one CSV row; raises ValueError with the reason"""
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip()
+    role = (row.get('role') or '').strip().lower()
+    if not username or not email:
+        raise ValueError('missing username or email')
+    if role not in ROLES:
+        raise ValueError('invalid role')
+
+    latitude = longitude = None
+    if row.get('latitude') and row.get('longitude'):
+        try:
+            latitude = Decimal(row['latitude']).quantize(Decimal('0.000001'))
+            longitude = Decimal(row['longitude']).quantize(Decimal('0.000001'))
+        except InvalidOperation:
+            raise ValueError('invalid location')
+        # NaN parses as a Decimal but can't be compared
+        if not latitude.is_finite() or not longitude.is_finite():
+            raise ValueError('invalid location')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('invalid location')
+
+    blood_group = (row.get('blood_group') or '').strip().upper()
+    if blood_group and blood_group not in BLOOD_GROUPS:
+        raise ValueError('invalid blood_group')
+
+    age = (row.get('age') or '').strip()
+    if age and not age.isdigit():
+        raise ValueError('invalid age')
+
+    return {
+        'username': username,
+        'email': email,
+        'role': role,
+        'password': row.get('password') or '',
+        'first_name': (row.get('first_name') or '').strip(),
+        'last_name': (row.get('last_name') or '').strip(),
+        'latitude': latitude,
+        'longitude': longitude,
+        'location_name': (row.get('location_name') or '').strip(),
+        'blood_group': blood_group,
+        'age': int(age) if age else None,
+        'phone_number': (row.get('phone_number') or '').strip(),
+        'name': (row.get('name') or '').strip(),
+        'address': (row.get('address') or '').strip(),
+    }
+
+
+def build_profile(user, row):
+    """Unsaved role profile for a new user, with the signal's defaults"""
+    if user.role == 'donor':
+        return DonorProfile(
+            user=user,
+            blood_group=row['blood_group'] or 'O+',
+            age=row['age'],
+            phone_number=row['phone_number'],
+        )
+    if user.role == 'bloodbank':
+        return BloodBank(
+            user=user,
+            name=row['name'] or user.username,
+            address=row['address'],
+            contact_number=row['phone_number'],
+        )
+    return PatientProfile(
+        user=user,
+        phone_number=row['phone_number'],
+        age=row['age'] or 0,
+        blood_group=row['blood_group'] or None,
+        address=row['address'] or None,
+    )
+
+
+class Command(BaseCommand):
+    help = "Bulk-create users and their role profiles from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV file with a header row')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Users inserted per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Password hashing processes (default: one per CPU)'
+        )
+        parser.add_argument(
+            '--hash-iterations', type=int, default=None,
+            help='PBKDF2 iterations for the imported hashes; upgraded on first login'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only validate the file and report what would be imported'
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['hash_iterations'] and get_hasher().algorithm != 'pbkdf2_sha256':
+            raise CommandError("--hash-iterations needs PBKDF2PasswordHasher as the default hasher")
+
+        started = time.perf_counter()
+        rows, skipped = self.read_rows(options['csv_file'])
+        rows = self.drop_existing(rows, skipped)
+        read_seconds = time.perf_counter() - started
+
+        skipped_total = sum(skipped.values())
+        self.stdout.write(f"{len(rows)} user(s) to import, {skipped_total} row(s) skipped ({read_seconds:.1f}s)")
+        for reason, count in sorted(skipped.items()):
+            self.stdout.write(f"  {reason}: {count}")
+        if options['dry_run'] or not rows:
+            return
+
+        created, hash_seconds, write_seconds, wait_seconds = self.import_rows(rows, options)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} user(s) in {elapsed:.1f}s ({created / elapsed:.0f} users/s)"
+        ))
+        self.stdout.write(
+            f"  hashing  {hash_seconds:.1f}s CPU on {options['workers']} worker(s) "
+            f"({created / max(hash_seconds, 1e-9):.0f} hashes/s per worker)"
+        )
+        self.stdout.write(f"  writing  {write_seconds:.1f}s ({created / max(write_seconds, 1e-9):.0f} users/s)")
+        self.stdout.write(f"  waiting for hashes  {wait_seconds:.1f}s")
+
+    def read_rows(self, path):
+        """Valid rows with no duplicates inside the file, and skip counts by reason"""
+        rows = []
+        skipped = {}
+        usernames, emails = set(), set()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                for line, raw in enumerate(csv.DictReader(f), start=2):
+                    try:
+                        row = parse_row(raw)
+                        if row['username'] in usernames or row['email'].lower() in emails:
+                            raise ValueError('duplicate in file')
+                    except ValueError as e:
+                        skipped[str(e)] = skipped.get(str(e), 0) + 1
+                        if self.verbosity >= 2:
+                            self.stdout.write(f"  line {line}: {e}")
+                        continue
+                    usernames.add(row['username'])
+                    emails.add(row['email'].lower())
+                    rows.append(row)
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        return rows, skipped
+
+    def drop_existing(self, rows, skipped):
+        """Rows whose username and email are not taken yet"""
+        taken_usernames, taken_emails = set(), set()
+        for chunk in chunked(rows, LOOKUP_CHUNK):
+            taken_usernames.update(
+                User.objects.filter(username__in=[row['username'] for row in chunk])
+                .values_list('username', flat=True)
+            )
+            taken_emails.update(
+                email.lower() for email in
+                User.objects.filter(email__in=[row['email'] for row in chunk])
+                .values_list('email', flat=True)
+            )
+
+        fresh = [
+            row for row in rows
+            if row['username'] not in taken_usernames and row['email'].lower() not in taken_emails
+        ]
+        if len(fresh) < len(rows):
+            skipped['already exists'] = len(rows) - len(fresh)
+        return fresh
+
+    def import_rows(self, rows, options):
+        """Hash in the pool and insert batch by batch as hashes arrive"""
+        hash_chunks = list(chunked([row['password'] for row in rows], HASH_CHUNK))
+        write_seconds = wait_seconds = 0.0
+        created = 0
+
+        executor = None
+        if options['workers'] > 1:
+            # Workers set Django up themselves in case they are spawned, not forked
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+            results = executor.map(hash_passwords, hash_chunks, [options['hash_iterations']] * len(hash_chunks))
+        else:
+            results = (hash_passwords(chunk, options['hash_iterations']) for chunk in hash_chunks)
+
+        timings = []
+
+        def collect(results):
+            for chunk_hashes, seconds in results:
+                timings.append(seconds)
+                yield from chunk_hashes
+
+        try:
+            hashes = collect(results)
+            for batch in chunked(rows, options['batch_size']):
+                waited = time.perf_counter()
+                passwords = list(islice(hashes, len(batch)))
+                wait_seconds += time.perf_counter() - waited
+
+                written = time.perf_counter()
+                self.write_batch(batch, passwords)
+                write_seconds += time.perf_counter() - written
+
+                created += len(batch)
+                if self.verbosity >= 2:
+                    self.stdout.write(f"  {created}/{len(rows)} users")
+            hash_seconds = sum(timings)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        return created, hash_seconds, write_seconds, wait_seconds
+
+    def write_batch(self, batch, passwords):
+        """One transaction: a batch of users plus their profiles"""
+        users = [
+            User(
+                username=row['username'],
+                email=row['email'],
+                role=row['role'],
+                password=password,
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                latitude=row['latitude'],
+                longitude=row['longitude'],
+                location_name=row['location_name'] or (
+                    place_name(float(row['latitude']), float(row['longitude']))
+                    if row['latitude'] is not None else None
+                ),
+            )
+            for row, password in zip(batch, passwords)
+        ]
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backends that can't return ids from a bulk insert
+                ids = dict(
+                    User.objects.filter(username__in=[user.username for user in users])
+                    .values_list('username', 'id')
+                )
+                for user in users:
+                    user.pk = ids[user.username]
+
+            profiles = {}
+            for user, row in zip(users, batch):
+                profile = build_profile(user, row)
+                profiles.setdefault(type(profile), []).append(profile)
+            for model, objects in profiles.items():
+                model.objects.bulk_create(objects)
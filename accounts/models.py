@@ -48,9 +48,18 @@ Custom User Model with Role-Based Access Control (RBAC)
 """
 
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 
+# Reverse one-to-one accessor of the profile model for each role
+ROLE_PROFILE_RELATIONS = {
+    'donor': 'donor_profile',
+    'bloodbank': 'blood_bank_profile',
+    'patient': 'patient_profile',
+}
+
+
 class User(AbstractUser):
     """
     Custom User model extending AbstractUser
@@ -94,6 +103,9 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['role'], name='user_role_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
@@ -107,3 +119,13 @@ class User(AbstractUser):
 
     def is_patient(self):
         return self.role == 'patient'
+
+    def get_role_profile(self):
+        """Return the DonorProfile / BloodBank / PatientProfile for this user's role"""
+        relation = ROLE_PROFILE_RELATIONS.get(self.role)
+        if relation is None:
+            return None
+        try:
+            return getattr(self, relation)
+        except ObjectDoesNotExist:
+            return None
@@ -0,0 +1,70 @@
+"""
+Keyset (seek) pagination helpers
+
+Pages are addressed by the (datetime field, id) of the last row seen rather
+than an OFFSET, so every page costs the same index range scan.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(value, pk):
+    """Encode a (datetime, id) position as a URL-safe string"""
+    delta = value - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f"{micros}_{pk}"
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+    Returns (datetime, id) or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+
+    try:
+        micros, pk = cursor.split('_', 1)
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+def keyset_paginate(queryset, order_field, cursor=None, page_size=25, descending=False):
+    """
+    Return one page of queryset ordered by (order_field, id)
+
+    Usage:
+        items, next_cursor = keyset_paginate(
+            schedules, 'scheduled_date', request.GET.get('cursor')
+        )
+
+    next_cursor is None on the last page.
+    """
+    direction = 'lt' if descending else 'gt'
+    prefix = '-' if descending else ''
+
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        # Bound the range on order_field first so the index is used for the seek
+        queryset = queryset.filter(
+            **{f'{order_field}__{direction}e': value}
+        ).filter(
+            Q(**{f'{order_field}__{direction}': value}) |
+            Q(**{f'id__{direction}': pk})
+        )
+
+    items = list(queryset.order_by(f'{prefix}{order_field}', f'{prefix}id')[:page_size + 1])
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, order_field), last.pk)
+
+    return items, next_cursor
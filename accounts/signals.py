@@ -6,26 +6,48 @@ from django.dispatch import receiver
 from .models import User
 from donors.models import DonorProfile
 from bloodbanks.models import BloodBank
+from patients.models import PatientProfile
+
+
+def create_role_profile(user):
+    """
+    Return the profile for the user's role, creating it with default
+    values if it is missing (None for users without a profile role)
+    """
+    if user.role == 'donor':
+        # Age and blood_group will be set by user in profile
+        profile, created = DonorProfile.objects.get_or_create(
+            user=user,
+            defaults={
+                'blood_group': 'O+',
+            }
+        )
+    elif user.role == 'bloodbank':
+        profile, created = BloodBank.objects.get_or_create(
+            user=user,
+            defaults={
+                'name': user.username,
+                'address': '',
+                'contact_number': '',
+            }
+        )
+    elif user.role == 'patient':
+        # Details are filled in on the profile page
+        profile, created = PatientProfile.objects.get_or_create(
+            user=user,
+            defaults={
+                'phone_number': '',
+                'age': 0,
+            }
+        )
+    else:
+        return None
+    return profile
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Create profile automatically when user is created"""
     if created:
-        if instance.role == 'donor':
-            # Create donor profile with default values
-            # Age and blood_group will be set by user in profile
-            DonorProfile.objects.get_or_create(
-                user=instance,
-                defaults={
-                    'blood_group': 'O+',
-                }
-            )
-        elif instance.role == 'bloodbank':
-            # Create blood bank profile
-            BloodBank.objects.create(
-                user=instance,
-                address='',
-                contact_number='',
-            )
+        create_role_profile(instance)
 
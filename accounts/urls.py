@@ -12,5 +12,8 @@ urlpatterns = [
     path('register/', views.user_register, name='register'),
     path('logout/', views.user_logout, name='logout'),
     path('redirect/', views.login_redirect, name='login_redirect'),
+    path('location/', views.location_update, name='location_update'),
+    path('geocode/search/', views.geocode_search, name='geocode_search'),
+    path('geocode/reverse/', views.geocode_reverse, name='geocode_reverse'),
 ]
 
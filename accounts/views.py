@@ -1,12 +1,16 @@
 """
 Authentication views: Login, Register, Home
 """
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from .models import User
 from .forms import LoginForm, RegisterForm
+from .geocoder import get_geocoder
+from .location import update_location
 
 
 def home(request):
@@ -75,7 +79,8 @@ def user_register(request):
 
             user.save()
 
-            login(request, user)
+            # Not authenticated through a backend, so name the one to store
+            login(request, user, backend='accounts.backends.ProfileModelBackend')
             messages.success(
                 request,
                 f'Registration successful! Welcome to LifeLink, {user.username}!'
@@ -113,4 +118,68 @@ def user_logout(request):
     return redirect('accounts:home')
 
 
+# The gazetteer only changes on deploy, so browsers may reuse answers
+@require_GET
+@cache_control(public=True, max_age=86400)
+def geocode_search(request):
+    """
+    Places matching a name, for the location picker
+    Query params: q, limit
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', 0)) or None
+    except ValueError:
+        limit = None
+
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+
+    return JsonResponse({'results': get_geocoder().search(query, limit=limit)})
+
+
+@require_GET
+@cache_control(public=True, max_age=86400)
+def geocode_reverse(request):
+    """
+    Nearest known place to a point, or null
+    Query params: lat, lon
+    """
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lon are required numbers'}, status=400)
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'lat or lon out of range'}, status=400)
+
+    return JsonResponse({'result': get_geocoder().reverse(latitude, longitude)})
+
+
+@require_POST
+def location_update(request):
+    """
+    Report the current user's position; small or too frequent moves are
+    acknowledged without a write (see accounts/location.py)
+    POST params: latitude, longitude
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=401)
+
+    try:
+        latitude = float(request.POST['latitude'])
+        longitude = float(request.POST['longitude'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'latitude and longitude are required numbers'}, status=400)
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'latitude or longitude out of range'}, status=400)
+
+    written, reason = update_location(request.user, latitude, longitude)
 
+    return JsonResponse({
+        'updated': written,
+        'reason': reason,
+        'location_name': request.user.location_name,
+    })
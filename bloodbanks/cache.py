@@ -0,0 +1,34 @@
+"""
+Per-bank cache helpers for the blood bank dashboard
+
+Rendered dashboard fragments are keyed by a per-bank version stamp.
+Bumping the stamp invalidates every fragment for that bank at once.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(blood_bank_id):
+    return f'bloodbank:{blood_bank_id}:dashboard_version'
+
+
+def dashboard_cache_version(blood_bank_id):
+    """Get the current dashboard version stamp for a blood bank"""
+    return cache.get_or_set(_version_key(blood_bank_id), time.time_ns, None)
+
+
+def dashboard_fragment_key(blood_bank_id, fragment, *parts):
+    """Build the cache key for one rendered dashboard fragment"""
+    version = dashboard_cache_version(blood_bank_id)
+    suffix = ':'.join(str(part) for part in parts)
+    return f'bloodbank:{blood_bank_id}:dashboard:{fragment}:{version}:{suffix}'
+
+
+def invalidate_dashboard(*blood_bank_ids):
+    """Drop cached dashboard fragments for the given blood banks"""
+    stamp = time.time_ns()
+    cache.set_many(
+        {_version_key(blood_bank_id): stamp for blood_bank_id in blood_bank_ids},
+        None
+    )
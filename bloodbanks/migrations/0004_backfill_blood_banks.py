@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    BloodBank = apps.get_model('bloodbanks', 'BloodBank')
+
+    missing = User.objects.filter(role='bloodbank', blood_bank_profile__isnull=True)
+    BloodBank.objects.bulk_create(
+        [
+            BloodBank(user=user, name=user.username, address='', contact_number='')
+            for user in missing.iterator()
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_email'),
+        ('bloodbanks', '0003_bloodbank_description_bloodbank_emergency_contact_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
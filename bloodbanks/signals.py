@@ -0,0 +1,78 @@
+"""
+Signals for keeping the blood bank dashboard cache fresh and pushing
+live inventory / schedule notifications
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from chat.notifications import notify_user
+from donors.models import DonationSchedule
+from .cache import invalidate_dashboard
+from .models import BloodBank, BloodInventory
+
+
+@receiver(post_save, sender=BloodInventory)
+@receiver(post_delete, sender=BloodInventory)
+@receiver(post_save, sender=DonationSchedule)
+@receiver(post_delete, sender=DonationSchedule)
+def invalidate_bank_dashboard(sender, instance, **kwargs):
+    """Invalidate cached dashboard fragments when inventory or schedules change"""
+    invalidate_dashboard(instance.blood_bank_id)
+
+
+def send_schedule_changed(user_ids, schedule_id, status, scheduled_date, created=False):
+    """Send 'schedule_changed' to the donor and blood bank users of one schedule"""
+    for user_id in user_ids:
+        notify_user(
+            user_id, 'schedule_changed',
+            schedule_id=schedule_id,
+            status=status,
+            scheduled_date=scheduled_date.isoformat(),
+            created=created,
+        )
+
+
+@receiver(post_save, sender=BloodInventory)
+def notify_low_stock(sender, instance, **kwargs):
+    """Alert the blood bank when a blood group drops below the low stock threshold"""
+    if not instance.is_low_stock():
+        return
+
+    # Only touch the relation if the caller already loaded it
+    if BloodInventory.blood_bank.is_cached(instance):
+        user_id = instance.blood_bank.user_id
+    else:
+        user_id = None
+
+    def send():
+        bank_user_id = user_id or BloodBank.objects.filter(
+            id=instance.blood_bank_id
+        ).values_list('user_id', flat=True).first()
+        if bank_user_id is not None:
+            notify_user(
+                bank_user_id, 'inventory_low',
+                blood_group=instance.blood_group,
+                units=instance.units,
+            )
+
+    transaction.on_commit(send)
+
+
+@receiver(post_save, sender=DonationSchedule)
+def notify_schedule_change(sender, instance, created, **kwargs):
+    """Tell the donor and the blood bank that a schedule was created or changed"""
+    schedule_id, status, scheduled_date = instance.id, instance.status, instance.scheduled_date
+    if DonationSchedule.donor.is_cached(instance) and DonationSchedule.blood_bank.is_cached(instance):
+        user_ids = (instance.donor.user_id, instance.blood_bank.user_id)
+    else:
+        user_ids = None
+
+    def send():
+        # One query after commit instead of loading the donor and the bank
+        ids = user_ids or DonationSchedule.objects.filter(id=schedule_id).values_list(
+            'donor__user_id', 'blood_bank__user_id'
+        ).first()
+        if ids is not None:
+            send_schedule_changed(ids, schedule_id, status, scheduled_date, created=created)
+
+    transaction.on_commit(send)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('inventory/', views.manage_inventory, name='manage_inventory'),
     path('scheduled-donors/', views.scheduled_donors, name='scheduled_donors'),
     path('mark-completed/<int:schedule_id>/', views.mark_completed, name='mark_completed'),
+    path('mark-completed/bulk/', views.mark_completed_bulk, name='mark_completed_bulk'),
     path('profile/', views.profile, name='profile'),
 
 
@@ -1,67 +1,102 @@
 """
 Blood Bank views: Dashboard, Inventory, Scheduled Donors
 """
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.views.decorators.http import require_http_methods
 from accounts.decorators import bloodbank_required
-from .models import BloodBank, BloodInventory
+from accounts.pagination import keyset_paginate
+from .cache import dashboard_fragment_key
+from .models import BloodInventory
 from donors.models import DonationSchedule
 
 
+SCHEDULED_DONORS_PAGE_SIZE = 25
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
 @bloodbank_required
 def dashboard(request):
     """Blood Bank dashboard"""
-    try:
-        blood_bank = BloodBank.objects.get(user=request.user)
-    except BloodBank.DoesNotExist:
-        # Create profile if it doesn't exist
-        blood_bank = BloodBank.objects.create(
-            user=request.user,
-            address='',
-            contact_number=''
+    blood_bank = request.profile
+
+    now = timezone.now()
+    today = timezone.localdate(now)
+    next_week = now + timezone.timedelta(days=7)
+
+    # Stats and inventory fragments are cached per bank and invalidated on
+    # inventory/schedule changes; the day is part of the key so counts roll over
+    stats_key = dashboard_fragment_key(blood_bank.id, 'stats', today)
+    inventory_key = dashboard_fragment_key(blood_bank.id, 'inventory')
+    fragments = cache.get_many([stats_key, inventory_key])
+
+    if len(fragments) < 2:
+        # One inventory fetch serves the total, the low stock alerts and the table
+        inventory_items = list(
+            BloodInventory.objects.filter(blood_bank=blood_bank).order_by('blood_group')
         )
-    
-    # Inventory statistics
-    total_units = blood_bank.get_total_units()
-    low_stock_alerts = blood_bank.get_low_stock_alerts()
-    
+        total_units = sum(item.units for item in inventory_items)
+        low_stock_alerts = [item for item in inventory_items if item.is_low_stock()]
+
+        counts = DonationSchedule.objects.filter(
+            blood_bank=blood_bank,
+            status='scheduled'
+        ).aggregate(
+            today_count=Count('id', filter=Q(scheduled_date__date=today)),
+            upcoming_count=Count('id', filter=Q(
+                scheduled_date__gte=now,
+                scheduled_date__lte=next_week
+            )),
+        )
+
+        fragments = {
+            stats_key: render_to_string('bloodbanks/_dashboard_stats.html', {
+                'total_units': total_units,
+                'low_stock_alerts': low_stock_alerts,
+                'today_count': counts['today_count'],
+                'upcoming_count': counts['upcoming_count'],
+            }),
+            inventory_key: render_to_string('bloodbanks/_dashboard_inventory.html', {
+                'inventory_items': inventory_items,
+            }),
+        }
+        cache.set_many(fragments, DASHBOARD_CACHE_TIMEOUT)
+
     # Today's donations
-    today = timezone.now().date()
     today_donations = DonationSchedule.objects.filter(
         blood_bank=blood_bank,
         scheduled_date__date=today,
         status='scheduled'
-    ).select_related('donor', 'donor__user')
-    
+    ).select_related('donor', 'donor__user').order_by('scheduled_date')
+
     # Upcoming scheduled donors (next 7 days)
-    next_week = timezone.now() + timezone.timedelta(days=7)
     upcoming_donations = DonationSchedule.objects.filter(
         blood_bank=blood_bank,
-        scheduled_date__gte=timezone.now(),
+        scheduled_date__gte=now,
         scheduled_date__lte=next_week,
         status='scheduled'
-    ).select_related('donor', 'donor__user')[:10]
-    
-    # Get all inventory items
-    inventory_items = BloodInventory.objects.filter(blood_bank=blood_bank).order_by('blood_group')
-    
+    ).select_related('donor', 'donor__user').order_by('scheduled_date')[:10]
+
     context = {
         'blood_bank': blood_bank,
-        'total_units': total_units,
-        'low_stock_alerts': low_stock_alerts,
+        'stats_html': fragments[stats_key],
+        'inventory_html': fragments[inventory_key],
         'today_donations': today_donations,
         'upcoming_donations': upcoming_donations,
-        'inventory_items': inventory_items,
     }
-    
+
     return render(request, 'bloodbanks/dashboard.html', context)
 
 
 @bloodbank_required
 def manage_inventory(request):
     """Manage blood inventory"""
-    blood_bank = BloodBank.objects.get(user=request.user)
+    blood_bank = request.profile
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -117,13 +152,19 @@ def manage_inventory(request):
 @bloodbank_required
 def scheduled_donors(request):
     """View all scheduled donors"""
-    blood_bank = BloodBank.objects.get(user=request.user)
+    blood_bank = request.profile
     
-    # Get all scheduled donations
-    scheduled_donations = DonationSchedule.objects.filter(
-        blood_bank=blood_bank,
-        status='scheduled'
-    ).select_related('donor', 'donor__user').order_by('scheduled_date')
+    # Scheduled donations, one keyset page at a time
+    cursor = request.GET.get('cursor')
+    scheduled_donations, next_cursor = keyset_paginate(
+        DonationSchedule.objects.filter(
+            blood_bank=blood_bank,
+            status='scheduled'
+        ).select_related('donor', 'donor__user'),
+        'scheduled_date',
+        cursor=cursor,
+        page_size=SCHEDULED_DONORS_PAGE_SIZE
+    )
     
     # Get completed donations
     completed_donations = DonationSchedule.objects.filter(
@@ -135,6 +176,8 @@ def scheduled_donors(request):
         'blood_bank': blood_bank,
         'scheduled_donations': scheduled_donations,
         'completed_donations': completed_donations,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
     }
     
     return render(request, 'bloodbanks/scheduled_donors.html', context)
@@ -144,7 +187,9 @@ def scheduled_donors(request):
 def mark_completed(request, schedule_id):
     """Mark a donation as completed"""
     try:
-        schedule = DonationSchedule.objects.get(id=schedule_id, blood_bank__user=request.user)
+        schedule = DonationSchedule.objects.select_related('donor', 'blood_bank').get(
+            id=schedule_id, blood_bank__user=request.user
+        )
         schedule.mark_completed()
         messages.success(request, 'Donation marked as completed!')
     except DonationSchedule.DoesNotExist:
@@ -152,6 +197,32 @@ def mark_completed(request, schedule_id):
     
     return redirect('bloodbanks:scheduled_donors')
 
+
+@bloodbank_required
+@require_http_methods(["POST"])
+def mark_completed_bulk(request):
+    """Mark several selected donations as completed in one go"""
+    schedule_ids = [
+        int(schedule_id)
+        for schedule_id in request.POST.getlist('schedule_ids')
+        if schedule_id.isdigit()
+    ]
+
+    if not schedule_ids:
+        messages.error(request, 'Please select at least one donation.')
+        return redirect('bloodbanks:scheduled_donors')
+
+    blood_bank = request.profile
+    completed = DonationSchedule.mark_completed_bulk(blood_bank, schedule_ids)
+
+    if completed:
+        messages.success(request, f'{completed} donation(s) marked as completed!')
+    else:
+        messages.error(request, 'No matching scheduled donations found')
+
+    return redirect('bloodbanks:scheduled_donors')
+
+
 @bloodbank_required
 def profile(request):
     """
@@ -160,15 +231,7 @@ def profile(request):
     Edit & Update Mode (POST)
     """
 
-    # Ensure profile exists
-    blood_bank, created = BloodBank.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'name': request.user.username,
-            'address': '',
-            'contact_number': ''
-        }
-    )
+    blood_bank = request.profile
 
     # UPDATE PROFILE
     if request.method == 'POST':
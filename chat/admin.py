@@ -2,7 +2,9 @@
 Admin configuration for chat app
 """
 from django.contrib import admin
-from .models import ChatRoom, Message
+from django.db.models import Q
+from .models import ChatRoom, Message, MessageArchive
+from .search import get_search_backend
 
 
 @admin.register(ChatRoom)
@@ -16,4 +18,23 @@ class MessageAdmin(admin.ModelAdmin):
     list_display = ('room', 'sender', 'receiver', 'timestamp')
     list_filter = ('timestamp',)
     search_fields = ('sender__username', 'receiver__username', 'content')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Match content through the search index instead of a LIKE scan"""
+        if not search_term:
+            return queryset, False
+        by_username = queryset.filter(
+            Q(sender__username__icontains=search_term) | Q(receiver__username__icontains=search_term)
+        )
+        by_content = get_search_backend().filter_queryset(queryset, search_term)
+        return by_username | by_content, False
 
+
+@admin.register(MessageArchive)
+class MessageArchiveAdmin(admin.ModelAdmin):
+    list_display = ('room', 'message_count', 'first_timestamp', 'last_timestamp', 'created_at')
+    exclude = ('data',)
+    readonly_fields = (
+        'room', 'first_message_id', 'last_message_id', 'first_timestamp',
+        'last_timestamp', 'message_count', 'created_at',
+    )
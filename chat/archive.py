@@ -0,0 +1,154 @@
+"""
+Retention for chat messages: a small hot table plus a compressed archive
+
+archive_messages moves messages older than ARCHIVE_AFTER_DAYS out of
+chat_message, oldest first, into per-room MessageArchive chunks of
+CHUNK_SIZE messages (zlib-compressed JSON). history_page() reads the hot
+table first and only decompresses archive chunks once a reader scrolls
+past it, using the same (timestamp, id) cursor throughout.
+
+Archived messages leave the search index along with the hot table.
+
+Settings (all optional):
+    CHAT_RETENTION = {
+        'ARCHIVE_AFTER_DAYS': 90,   # messages older than this are archived
+        'CHUNK_SIZE': 500,          # messages per compressed chunk
+    }
+"""
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from accounts.pagination import decode_cursor, encode_cursor, keyset_paginate
+from .models import Message, MessageArchive
+
+
+DEFAULTS = {
+    'ARCHIVE_AFTER_DAYS': 90,
+    'CHUNK_SIZE': 500,
+}
+
+COMPRESSION_LEVEL = 6
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'CHAT_RETENTION', {}))
+
+
+def serialize_chunk(messages):
+    """Compact JSON for a list of messages, oldest first"""
+    rows = [
+        [message.id, message.sender_id, message.receiver_id, message.content, message.timestamp.isoformat()]
+        for message in messages
+    ]
+    return json.dumps(rows, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def decode_chunk(archive):
+    """Unsaved Message objects from an archive chunk, oldest first"""
+    rows = json.loads(zlib.decompress(archive.data))
+    return [
+        Message(
+            id=message_id,
+            room_id=archive.room_id,
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            content=content,
+            timestamp=parse_datetime(timestamp),
+        )
+        for message_id, sender_id, receiver_id, content, timestamp in rows
+    ]
+
+
+def archive_chunk(room_id, cutoff, chunk_size):
+    """
+    Move the room's oldest messages before cutoff (at most chunk_size) into
+    one archive chunk. Returns (messages archived, raw bytes, stored bytes).
+    """
+    with transaction.atomic():
+        batch = list(
+            Message.objects.filter(room_id=room_id, timestamp__lt=cutoff)
+            .order_by('timestamp', 'id')[:chunk_size]
+        )
+        if not batch:
+            return 0, 0, 0
+
+        raw = serialize_chunk(batch)
+        data = zlib.compress(raw, COMPRESSION_LEVEL)
+
+        MessageArchive.objects.create(
+            room_id=room_id,
+            first_message_id=batch[0].id,
+            last_message_id=batch[-1].id,
+            first_timestamp=batch[0].timestamp,
+            last_timestamp=batch[-1].timestamp,
+            message_count=len(batch),
+            data=data,
+        )
+        # Also clears ChatRoom.last_message if it pointed into the batch
+        Message.objects.filter(id__in=[message.id for message in batch]).delete()
+
+    return len(batch), len(raw), len(data)
+
+
+def read_archive(room, before=None, limit=50):
+    """
+    Archived messages of room older than before ((timestamp, id) or None),
+    newest first. Chunks are fetched and decompressed only as needed.
+    Returns (messages, more) where more says whether older messages remain.
+    """
+    chunks = MessageArchive.objects.filter(room=room)
+    if before:
+        timestamp, pk = before
+        chunks = chunks.filter(
+            Q(first_timestamp__lt=timestamp) |
+            Q(first_timestamp=timestamp, first_message_id__lt=pk)
+        )
+    chunks = chunks.order_by('-last_timestamp', '-last_message_id')
+
+    if limit <= 0:
+        return [], chunks.exists()
+
+    messages = []
+    for archive in chunks.iterator(chunk_size=4):
+        for message in reversed(decode_chunk(archive)):
+            if before and (message.timestamp, message.id) >= before:
+                continue
+            if len(messages) == limit:
+                return messages, True
+            messages.append(message)
+    return messages, False
+
+
+def history_page(room, cursor=None, page_size=50):
+    """
+    One page of a room's messages, newest first, continuing from the hot
+    table into the archive. Returns (messages, next_cursor) like keyset_paginate.
+    """
+    messages, next_cursor = keyset_paginate(
+        Message.objects.filter(room=room),
+        'timestamp',
+        cursor=cursor,
+        page_size=page_size,
+        descending=True
+    )
+    if next_cursor is not None:
+        return messages, next_cursor
+
+    # The hot table is exhausted; anything older lives in the archive
+    if messages:
+        before = (messages[-1].timestamp, messages[-1].id)
+    else:
+        before = decode_cursor(cursor)
+
+    archived, more = read_archive(room, before, page_size - len(messages))
+    messages.extend(archived)
+
+    if more:
+        last = messages[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+    return messages, next_cursor
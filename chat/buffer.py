@@ -0,0 +1,221 @@
+"""
+Write-behind buffer for chat messages
+
+ChatConsumer broadcasts a message first and hands it to this buffer, which
+writes pending messages with one bulk_create when either MAX_BATCH messages
+are waiting or FLUSH_INTERVAL seconds have passed. There is one buffer per
+process, shared by every consumer running in it.
+
+Messages are already delivered when their batch is written, so a batch
+that fails (e.g. the database is locked or briefly unreachable) goes back
+to the head of the queue and is retried with exponential backoff. Only
+after MAX_RETRIES failures in a row is it dropped and logged as an error;
+rows rejected by the database (a deleted room) are dropped straight away.
+Use 'sync' mode when no message may ever be lost, at the cost of one
+INSERT per message before it is broadcast.
+
+Settings (all optional):
+    CHAT_MESSAGE_WRITE_MODE = 'write_behind'   # or 'sync' for per-message inserts
+    CHAT_WRITE_BUFFER = {
+        'MAX_BATCH': 100,        # flush as soon as this many messages are pending
+        'FLUSH_INTERVAL': 0.5,   # seconds before a partial batch is flushed
+        'MAX_PENDING': 5000,     # bound on the queue; producers wait when full,
+                                 # also while a failing batch waits for its retry
+        'MAX_RETRIES': 5,        # failed writes of a batch before it is dropped
+    }
+"""
+import asyncio
+import atexit
+import logging
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import ChatRoom, Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_BATCH': 100,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_PENDING': 5000,
+    'MAX_RETRIES': 5,
+}
+
+# Longest wait between two attempts at a failing batch, in seconds
+MAX_RETRY_DELAY = 30
+
+
+def write_behind_enabled():
+    """True unless the deployment asked for synchronous per-message writes"""
+    return getattr(settings, 'CHAT_MESSAGE_WRITE_MODE', 'write_behind') != 'sync'
+
+
+def write_messages(messages):
+    """
+    Persist a batch of unsaved Message objects
+    A bad row (e.g. a room deleted meanwhile) only drops that row, not the batch.
+    Returns the number of messages written.
+    """
+    try:
+        return len(ChatRoom.post_messages(messages))
+    except IntegrityError:
+        logger.warning("Bulk message insert failed, retrying %d messages one by one", len(messages))
+
+    written = 0
+    for message in messages:
+        try:
+            ChatRoom.post_messages([message])
+            written += 1
+        except IntegrityError:
+            logger.exception("Dropping chat message for room %s", message.room_id)
+    return written
+
+
+class MessageWriteBuffer:
+    """Bounded, per-process queue of chat messages waiting to be written"""
+
+    def __init__(self, max_batch, flush_interval, max_pending, max_retries):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+
+        self._pending = []
+        self._flush_lock = None
+        self._timer = None
+        # Failed writes in a row of the batch at the head of the queue
+        self._failures = 0
+
+        self.metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'retries': 0,
+            'batches': 0,
+            'largest_batch': 0,
+            'full_waits': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def stats(self):
+        """Snapshot of the buffer counters plus the current queue depth"""
+        return dict(self.metrics, pending=len(self._pending), max_pending=self.max_pending)
+
+    async def add(self, room_id, sender_id, receiver_id, content):
+        """Queue a message; waits for a flush if the queue is full"""
+        # Stamped now, not when the batch is finally written
+        message = Message(
+            room_id=room_id,
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            content=content,
+            timestamp=timezone.now(),
+        )
+
+        while len(self._pending) >= self.max_pending:
+            self.metrics['full_waits'] += 1
+            if self._retry_scheduled():
+                # Shielded: a producer giving up must not cancel the retry
+                await asyncio.shield(self._timer)
+            else:
+                await self.flush()
+
+        self._pending.append(message)
+        self.metrics['enqueued'] += 1
+
+        if self._retry_scheduled():
+            # The backoff decides when the database is tried again
+            return
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self, delay=None):
+        await asyncio.sleep(self.flush_interval if delay is None else delay)
+        await self.flush()
+
+    def _retry_scheduled(self):
+        return self._failures > 0 and self._timer is not None and not self._timer.done()
+
+    def _retry_delay(self):
+        return min(self.flush_interval * 2 ** self._failures, MAX_RETRY_DELAY)
+
+    async def flush(self):
+        """Write everything pending; concurrent callers wait for the same flush"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                if not await database_sync_to_async(self._write)(batch):
+                    # Back off instead of hammering a database that is down
+                    self._timer = asyncio.ensure_future(self._flush_later(self._retry_delay()))
+                    break
+
+    def flush_sync(self):
+        """Write everything pending from synchronous code (process shutdown)"""
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._write(batch):
+                time.sleep(self._retry_delay())
+
+    def _write(self, batch):
+        """
+        Write one batch; False if it failed and was put back to be retried
+        """
+        started = time.monotonic()
+        try:
+            written = write_messages(batch)
+        except Exception:
+            self._failures += 1
+            if self._failures <= self.max_retries:
+                logger.warning(
+                    "Failed to write %d chat messages (attempt %d of %d), retrying",
+                    len(batch), self._failures, self.max_retries + 1, exc_info=True
+                )
+                self._pending[:0] = batch
+                self.metrics['retries'] += 1
+                return False
+            logger.exception(
+                "Dropping %d chat messages after %d failed writes", len(batch), self._failures
+            )
+            written = 0
+        self._failures = 0
+
+        self.metrics['written'] += written
+        self.metrics['dropped'] += len(batch) - written
+        self.metrics['batches'] += 1
+        self.metrics['largest_batch'] = max(self.metrics['largest_batch'], len(batch))
+        self.metrics['last_flush_ms'] = round((time.monotonic() - started) * 1000, 2)
+        return True
+
+
+_buffer = None
+
+
+def stats():
+    """Snapshot of the write buffer counters (empty until the buffer is used)"""
+    return _buffer.stats() if _buffer is not None else {}
+
+
+def get_message_buffer():
+    """Return the process-wide MessageWriteBuffer, creating it on first use"""
+    global _buffer
+    if _buffer is None:
+        config = dict(DEFAULTS, **getattr(settings, 'CHAT_WRITE_BUFFER', {}))
+        _buffer = MessageWriteBuffer(
+            max_batch=config['MAX_BATCH'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            max_pending=config['MAX_PENDING'],
+            max_retries=config['MAX_RETRIES'],
+        )
+        atexit.register(_buffer.flush_sync)
+    return _buffer
@@ -1,89 +1,417 @@
 """
-WebSocket consumers for real-time chat
+WebSocket consumers for real-time chat and notifications
 """
-import json
+import time
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from .models import ChatRoom, Message
-from accounts.models import User
+from django.db.models import Q
+from .buffer import get_message_buffer, write_behind_enabled
+from .models import ChatRoom
+from . import presence
+from .notifications import group_send, user_group_name
+from .protocol import RoomCodec, StreamCodec, negotiate
+from .throttle import FlowControlMixin
+from lifelink.metrics import counter, registry
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+CONNECTIONS = counter('lifelink_chat_connections_total', 'WebSocket connections accepted', ['consumer'])
+DISCONNECTIONS = counter('lifelink_chat_disconnections_total', 'Accepted WebSocket connections closed', ['consumer'])
+MESSAGES = counter('lifelink_chat_messages_total', 'Chat messages published')
+
+
+def room_group_name(room_id):
+    """Channel-layer group carrying one chat room's messages"""
+    return f'chat_{room_id}'
+
+
+@database_sync_to_async
+def save_message(room, sender, content):
+    """Save message to database"""
+    try:
+        room.post_message(sender, room.get_other_participant(sender), content)
+    except Exception as e:
+        print(f"Error saving message: {e}")
+
+
+async def publish_chat_message(channel_layer, room, sender, content):
+    """
+    Persist (now or write-behind) and broadcast a message from sender to
+    the other participant of room. Shared by ChatConsumer and UserConsumer.
+    """
+    if not write_behind_enabled():
+        # Durable mode: the message is in the database before anyone sees it
+        await save_message(room, sender, content)
+    
+    # Send message to room group
+    await group_send(
+        channel_layer,
+        room_group_name(room.id),
+        {
+            'type': 'chat_message',
+            'room_id': room.id,
+            'message': content,
+            'sender_id': sender.id,
+            'sender_username': sender.username,
+        }
+    )
+    
+    if write_behind_enabled():
+        # Broadcast first, write later in a batch with other messages
+        receiver = room.get_other_participant(sender)
+        await get_message_buffer().add(room.id, sender.id, receiver.id, content)
+    
+    MESSAGES.inc()
+    registry.tick()
+
+
+async def broadcast_presence(channel_layer, user, room_ids, online):
+    """Tell the other participants of room_ids that user came online or went offline"""
+    for room_id in room_ids:
+        await group_send(
+            channel_layer,
+            room_group_name(room_id),
+            {
+                'type': 'chat_presence',
+                'user_id': user.id,
+                'online': online,
+                'last_seen': None if online else time.time(),
+            }
+        )
+
+
+async def presence_connected(channel_layer, user, room_ids):
+    if await sync_to_async(presence.user_connected)(user.id):
+        await broadcast_presence(channel_layer, user, room_ids, True)
+
+
+async def presence_disconnected(channel_layer, user, room_ids):
+    if await sync_to_async(presence.user_disconnected)(user.id):
+        await broadcast_presence(channel_layer, user, room_ids, False)
+
+
+async def presence_heartbeat(channel_layer, user, room_ids):
+    if await sync_to_async(presence.heartbeat)(user.id):
+        await broadcast_presence(channel_layer, user, room_ids, True)
+
+
+async def publish_typing(channel_layer, room, user):
+    """Broadcast a typing event, coalesced to one per interval per room and typist"""
+    if await sync_to_async(presence.should_broadcast_typing)(room.id, user.id):
+        await group_send(
+            channel_layer,
+            room_group_name(room.id),
+            {
+                'type': 'chat_typing',
+                'room_id': room.id,
+                'user_id': user.id,
+                'username': user.username,
+            }
+        )
+
+
+class ChatConsumer(FlowControlMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for chat functionality"""
     
     async def connect(self):
         """Handle WebSocket connection"""
         self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
+        self.room_group_name = room_group_name(self.room_id)
         self.user = self.scope['user']
         
         if self.user.is_anonymous:
             await self.close()
             return
         
+        # Resolve the room and its participants once; only members may join
+        self.room = await self.get_room_for_user(self.room_id)
+        if self.room is None:
+            await self.close(code=4403)
+            return
+        
+        # The receiver is always derived from the room (publish_chat_message),
+        # never client-supplied
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
         
-        await self.accept()
+        # Verbose JSON unless the client asked for a compact subprotocol
+        self.codec = negotiate(self.scope, RoomCodec)
+        await self.accept(subprotocol=self.codec.subprotocol)
+        self.start_flow_control()
+        CONNECTIONS.labels('room').inc()
+        
+        users = self.codec.users({
+            self.room.participant1_id: self.room.participant1.username,
+            self.room.participant2_id: self.room.participant2.username,
+        })
+        if users is not None:
+            await self.send_queued(users)
+        
+        await presence_connected(self.channel_layer, self.user, [self.room.id])
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        if getattr(self, 'writer_task', None) is not None:
+            DISCONNECTIONS.labels('room').inc()
+        await self.stop_flow_control()
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        
+        if getattr(self, 'room', None) is not None:
+            await presence_disconnected(self.channel_layer, self.user, [self.room.id])
+            
+            # Persist this connection's buffered messages before leaving
+            if write_behind_enabled():
+                await get_message_buffer().flush()
+            
+            # Everything delivered while the room was open has been seen
+            await self.mark_room_read()
     
-    async def receive(self, text_data):
-        """Receive message from WebSocket"""
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        receiver_id = text_data_json['receiver_id']
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Receive a frame from the WebSocket:
+        {"message": "..."}, {"typing": true} or {"heartbeat": true}
+        """
+        # Size and rate checks run before the frame is parsed
+        if not await self.admit_frame(text_data, bytes_data):
+            return
         
-        # Save message to database
-        await self.save_message(self.room_id, receiver_id, message)
+        try:
+            frame = self.codec.decode(text_data, bytes_data)
+            message = frame.get('message')
+        except (ValueError, AttributeError):
+            return
         
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'sender_id': self.user.id,
-                'sender_username': self.user.username,
-            }
-        )
+        if frame.get('typing'):
+            await publish_typing(self.channel_layer, self.room, self.user)
+            return
+        if frame.get('heartbeat'):
+            await presence_heartbeat(self.channel_layer, self.user, [self.room.id])
+            return
+        if not isinstance(message, str) or not message.strip():
+            return
+        
+        await publish_chat_message(self.channel_layer, self.room, self.user, message)
+    
+    def binary_frames_allowed(self):
+        return self.codec.binary
+    
+    def throttled_frame(self):
+        return self.codec.error('rate_limited')
+    
+    def outbound_frame_dropped(self):
+        self.codec.frame_dropped()
     
     async def chat_message(self, event):
         """Receive message from room group"""
-        message = event['message']
-        sender_id = event['sender_id']
-        sender_username = event['sender_username']
-        
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': message,
-            'sender_id': sender_id,
-            'sender_username': sender_username,
-        }))
+        # Send message to WebSocket; a client that can't keep up loses frames
+        await self.send_queued(self.codec.chat(
+            event['room_id'], event['sender_id'], event['sender_username'], event['message']
+        ))
+    
+    async def chat_typing(self, event):
+        """Forward the other participant's typing event"""
+        if event['user_id'] != self.user.id:
+            await self.send_queued(self.codec.typing(event['room_id'], event['user_id'], event['username']))
+    
+    async def chat_presence(self, event):
+        """Forward the other participant's online/offline change"""
+        if event['user_id'] != self.user.id:
+            await self.send_queued(self.codec.presence(event['user_id'], event['online'], event['last_seen']))
     
     @database_sync_to_async
-    def save_message(self, room_id, receiver_id, content):
-        """Save message to database"""
+    def get_room_for_user(self, room_id):
+        """Return the room if this user is one of its participants, else None"""
         try:
-            room = ChatRoom.objects.get(id=room_id)
-            receiver = User.objects.get(id=receiver_id)
-            
-            Message.objects.create(
-                room=room,
-                sender=self.user,
-                receiver=receiver,
-                content=content
+            return ChatRoom.objects.select_related('participant1', 'participant2').get(
+                Q(participant1=self.user) | Q(participant2=self.user),
+                id=int(room_id)
             )
-        except Exception as e:
-            print(f"Error saving message: {e}")
+        except (ChatRoom.DoesNotExist, ValueError):
+            return None
+    
+    @database_sync_to_async
+    def mark_room_read(self):
+        """Reset this user's unread counter for the room"""
+        self.room.mark_read(self.user)
 
+
+class UserConsumer(FlowControlMixin, AsyncWebsocketConsumer):
+    """
+    One multiplexed socket per user for all chat rooms and notifications
+    
+    Client -> server frames:
+        {"action": "send", "room": 12, "message": "..."}
+        {"action": "subscribe", "room": 12}
+        {"action": "unsubscribe", "room": 12}
+        {"action": "focus", "room": 12}   (room is marked read on disconnect)
+        {"action": "typing", "room": 12}
+        {"action": "heartbeat"}           (keeps the user shown as online)
+    
+    Server -> client frames:
+        {"stream": "chat", "room": 12, "data": {"message", "sender_id", "sender_username"}}
+        {"stream": "typing", "room": 12, "data": {"user_id", "username"}}
+        {"stream": "presence", "data": {"user_id", "online", "last_seen"}}
+        {"stream": "notification", "kind": "...", "data": {...}}
+        {"stream": "error", "data": {"detail": "..."}}
+    
+    Clients may negotiate compact frames by subprotocol, see chat/protocol.py.
+    """
+    
+    async def connect(self):
+        """Join the user's notification group and every room they belong to"""
+        self.user = self.scope['user']
+        self.rooms = {}
+        self.focused_room = None
+        
+        if self.user.is_anonymous:
+            await self.close()
+            return
+        
+        self.user_group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        
+        for room in await self.get_rooms():
+            await self.join_room(room)
+        
+        self.codec = negotiate(self.scope, StreamCodec)
+        await self.accept(subprotocol=self.codec.subprotocol)
+        self.start_flow_control()
+        CONNECTIONS.labels('user').inc()
+        
+        # Compact protocols get every chat partner's username once, up front
+        table = {}
+        for room in self.rooms.values():
+            table[room.participant1_id] = room.participant1.username
+            table[room.participant2_id] = room.participant2.username
+        users = self.codec.users(table)
+        if users is not None:
+            await self.send_queued(users)
+        
+        await presence_connected(self.channel_layer, self.user, list(self.rooms))
+    
+    async def disconnect(self, close_code):
+        """Leave every group joined by this socket"""
+        if self.user.is_anonymous:
+            return
+        
+        if getattr(self, 'writer_task', None) is not None:
+            DISCONNECTIONS.labels('user').inc()
+        await self.stop_flow_control()
+        await presence_disconnected(self.channel_layer, self.user, list(self.rooms))
+        await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        for room_id in list(self.rooms):
+            await self.channel_layer.group_discard(room_group_name(room_id), self.channel_name)
+        
+        if write_behind_enabled():
+            await get_message_buffer().flush()
+        
+        if self.focused_room is not None:
+            await self.mark_room_read(self.focused_room)
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        """Route an incoming frame by its action"""
+        if not await self.admit_frame(text_data, bytes_data):
+            return
+        
+        try:
+            frame = self.codec.decode(text_data, bytes_data)
+            action = frame['action']
+            if action == 'heartbeat':
+                await presence_heartbeat(self.channel_layer, self.user, list(self.rooms))
+                return
+            room_id = int(frame['room'])
+        except (ValueError, KeyError, TypeError):
+            await self.send_error('Malformed frame')
+            return
+        
+        if action == 'subscribe':
+            if room_id not in self.rooms:
+                room = await self.get_rooms(room_id=room_id)
+                if not room:
+                    await self.send_error('Not a member of this room')
+                    return
+                await self.join_room(room[0])
+            return
+        
+        room = self.rooms.get(room_id)
+        if room is None:
+            await self.send_error('Not subscribed to this room')
+            return
+        
+        if action == 'unsubscribe':
+            del self.rooms[room_id]
+            await self.channel_layer.group_discard(room_group_name(room_id), self.channel_name)
+            if self.focused_room == room:
+                self.focused_room = None
+        elif action == 'focus':
+            self.focused_room = room
+        elif action == 'typing':
+            await publish_typing(self.channel_layer, room, self.user)
+        elif action == 'send':
+            message = frame.get('message')
+            if not isinstance(message, str) or not message.strip():
+                await self.send_error('Empty message')
+                return
+            await publish_chat_message(self.channel_layer, room, self.user, message)
+        else:
+            await self.send_error(f'Unknown action: {action}')
+    
+    async def join_room(self, room):
+        self.rooms[room.id] = room
+        await self.channel_layer.group_add(room_group_name(room.id), self.channel_name)
+    
+    async def send_error(self, detail):
+        await self.send_queued(self.codec.error(detail))
+    
+    def binary_frames_allowed(self):
+        return self.codec.binary
+    
+    def throttled_frame(self):
+        return self.codec.error('Rate limit exceeded')
+    
+    def outbound_frame_dropped(self):
+        self.codec.frame_dropped()
+    
+    async def chat_message(self, event):
+        """Forward a room message to the socket, tagged with its room"""
+        await self.send_queued(self.codec.chat(
+            event['room_id'], event['sender_id'], event['sender_username'], event['message']
+        ))
+    
+    async def chat_typing(self, event):
+        """Forward another participant's typing event, tagged with its room"""
+        if event['user_id'] != self.user.id:
+            await self.send_queued(self.codec.typing(event['room_id'], event['user_id'], event['username']))
+    
+    async def chat_presence(self, event):
+        """Forward a chat partner's online/offline change"""
+        if event['user_id'] != self.user.id:
+            await self.send_queued(self.codec.presence(event['user_id'], event['online'], event['last_seen']))
+    
+    async def user_notification(self, event):
+        """Forward a personal notification to the socket"""
+        await self.send_queued(self.codec.notification(event['kind'], event['data']))
+    
+    @database_sync_to_async
+    def get_rooms(self, room_id=None):
+        """Rooms this user participates in (optionally just one of them)"""
+        rooms = ChatRoom.objects.filter(
+            Q(participant1=self.user) | Q(participant2=self.user)
+        ).select_related('participant1', 'participant2')
+        if room_id is not None:
+            rooms = rooms.filter(id=room_id)
+        return list(rooms)
+    
+    @database_sync_to_async
+    def mark_room_read(self, room):
+        """Reset this user's unread counter for the room"""
+        room.mark_read(self.user)
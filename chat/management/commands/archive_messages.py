@@ -0,0 +1,80 @@
+"""
+Management command: move old chat messages into compressed archive chunks
+
+Usage:
+    python manage.py archive_messages
+    python manage.py archive_messages --days 30 --chunk-size 1000 --sleep 0.1
+    python manage.py archive_messages --dry-run
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.archive import archive_chunk, get_config
+from chat.models import ChatRoom, Message
+
+
+class Command(BaseCommand):
+    help = "Archive chat messages older than the retention window, room by room in chunks"
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument(
+            '--days', type=int, default=config['ARCHIVE_AFTER_DAYS'],
+            help=f"Archive messages older than this many days (default: {config['ARCHIVE_AFTER_DAYS']})"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=config['CHUNK_SIZE'],
+            help=f"Messages per archive chunk (default: {config['CHUNK_SIZE']})"
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between chunks to let other writers in'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the messages that would be archived'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = Message.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f"{count} message(s) older than {cutoff:%Y-%m-%d} would be archived")
+            return
+
+        started = time.monotonic()
+        archived = chunks = raw_bytes = stored_bytes = 0
+
+        # Per-room queries use the (room, timestamp, id) index
+        for room_id in ChatRoom.objects.values_list('id', flat=True).iterator():
+            while True:
+                count, raw, stored = archive_chunk(room_id, cutoff, options['chunk_size'])
+                if not count:
+                    break
+
+                archived += count
+                chunks += 1
+                raw_bytes += raw
+                stored_bytes += stored
+
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+                if count < options['chunk_size']:
+                    break
+
+        elapsed = time.monotonic() - started
+        rate = archived / elapsed if elapsed else archived
+        ratio = raw_bytes / stored_bytes if stored_bytes else 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} message(s) into {chunks} chunk(s) "
+            f"({elapsed:.2f}s, {rate:.0f} rows/s)"
+        ))
+        if chunks:
+            self.stdout.write(
+                f"  {raw_bytes / 1024:.1f} KiB of JSON stored as {stored_bytes / 1024:.1f} KiB "
+                f"({ratio:.1f}x smaller)"
+            )
@@ -0,0 +1,134 @@
+"""
+Management command: compare the chat wire formats
+
+Encodes the same simulated session (a username table, then a mix of chat
+messages, typing and presence events) with every codec in chat/protocol.py
+and reports bytes per frame and encode/decode time per frame. Decoding is
+what a client does with each frame (json.loads or msgpack.unpackb).
+
+Usage:
+    python manage.py benchmark_chat_protocol
+    python manage.py benchmark_chat_protocol --frames 50000 --json
+"""
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.protocol import CompactCodec, MsgpackCodec, RoomCodec, StreamCodec, msgpack
+
+
+SAMPLE_MESSAGES = [
+    "Hi, is O-negative blood available today?",
+    "Yes, we have 4 units in stock.",
+    "Thank you! Can I schedule a donation for tomorrow morning?",
+    "Sure, please come to the city blood bank at 10 AM and bring an ID.",
+    "ok",
+    "My father needs two units of B+ for surgery on Friday, please help if you can.",
+    "Reached the hospital, where should I go?",
+    "Ground floor, room 12. Ask for the donation desk.",
+]
+
+FIRST_NAMES = ['ravi', 'anita', 'suresh', 'priya', 'kiran', 'lakshmi', 'arjun', 'meena']
+
+
+def simulated_session(frames, senders, rooms, seed=1):
+    """Events of one busy session: (kind, args) tuples"""
+    rng = random.Random(seed)
+    users = {
+        100 + index: f'{rng.choice(FIRST_NAMES)}_{rng.choice(["donor", "bank", "patient"])}_{index}'
+        for index in range(senders)
+    }
+    user_ids = list(users)
+    room_ids = list(range(1, rooms + 1))
+
+    events = []
+    for _ in range(frames):
+        user_id = rng.choice(user_ids)
+        roll = rng.random()
+        if roll < 0.8:
+            events.append(('chat', (rng.choice(room_ids), user_id, users[user_id], rng.choice(SAMPLE_MESSAGES))))
+        elif roll < 0.95:
+            events.append(('typing', (rng.choice(room_ids), user_id, users[user_id])))
+        else:
+            online = rng.random() < 0.5
+            events.append(('presence', (user_id, online, None if online else time.time())))
+    return users, events
+
+
+def client_decoder(codec):
+    if codec.binary:
+        return lambda frame: msgpack.unpackb(frame, raw=False, strict_map_key=False)
+    return json.loads
+
+
+class Command(BaseCommand):
+    help = "Compare bytes per frame and encode/decode cost of the chat wire formats"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=20000,
+                            help='Frames in the simulated session (default: 20000)')
+        parser.add_argument('--senders', type=int, default=20,
+                            help='Distinct senders (default: 20)')
+        parser.add_argument('--rooms', type=int, default=10,
+                            help='Distinct rooms (default: 10)')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        users, events = simulated_session(options['frames'], options['senders'], options['rooms'])
+
+        codecs = [StreamCodec, RoomCodec, CompactCodec]
+        if msgpack is not None:
+            codecs.append(MsgpackCodec)
+
+        results = []
+        for codec_class in codecs:
+            codec = codec_class()
+            started = time.perf_counter()
+            frames = []
+            table = codec.users(users)
+            if table is not None:
+                frames.append(table)
+            for kind, args in events:
+                frames.append(getattr(codec, kind)(*args))
+            encode_seconds = time.perf_counter() - started
+
+            decode = client_decoder(codec)
+            started = time.perf_counter()
+            for frame in frames:
+                decode(frame)
+            decode_seconds = time.perf_counter() - started
+
+            total_bytes = sum(
+                len(frame) if isinstance(frame, bytes) else len(frame.encode('utf-8'))
+                for frame in frames
+            )
+            results.append({
+                'codec': codec_class.__name__,
+                'subprotocol': codec_class.subprotocol,
+                'frames': len(frames),
+                'total_bytes': total_bytes,
+                'bytes_per_frame': round(total_bytes / len(events), 1),
+                'encode_us_per_frame': round(encode_seconds / len(frames) * 1e6, 2),
+                'decode_us_per_frame': round(decode_seconds / len(frames) * 1e6, 2),
+            })
+
+        baseline = results[0]['total_bytes']
+        for result in results:
+            result['size_vs_json'] = round(result['total_bytes'] / baseline, 3)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'events': len(events), 'results': results}, indent=2))
+            return
+
+        self.stdout.write(f"{len(events)} events, {options['senders']} senders, {options['rooms']} rooms")
+        self.stdout.write(f"  {'codec':<14} {'bytes/frame':>12} {'vs json':>8} {'encode us':>10} {'decode us':>10}")
+        for result in results:
+            self.stdout.write(
+                f"  {result['codec']:<14} {result['bytes_per_frame']:>12} {result['size_vs_json']:>8} "
+                f"{result['encode_us_per_frame']:>10} {result['decode_us_per_frame']:>10}"
+            )
+        if msgpack is None:
+            self.stdout.write("  (msgpack is not installed, MsgpackCodec skipped)")
@@ -0,0 +1,210 @@
+"""
+Management command: verify cross-process fan-out of the channel layer
+
+Starts several worker processes that each join one channel-layer group,
+sends messages to that group from this process, and checks that every
+worker received every message. Reports group_send and delivery latency.
+
+Usage:
+    REDIS_URL=redis://127.0.0.1:6379/0 python manage.py check_channel_layer
+    python manage.py check_channel_layer --spawn-redis --workers 4 --messages 500
+    python manage.py check_channel_layer --redis-url redis://host:6379/1 --json
+"""
+import asyncio
+import json
+import multiprocessing
+import shutil
+import socket
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+GROUP = 'channel_layer_check'
+DEFAULT_BACKEND = 'channels_redis.core.RedisChannelLayer'
+
+
+def build_layer(layer_config):
+    """Instantiate a channel layer from a CHANNEL_LAYERS-style entry"""
+    backend = import_string(layer_config['BACKEND'])
+    return backend(**layer_config.get('CONFIG', {}))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 3)
+
+
+def worker_main(layer_config, ready, results):
+    """Worker process: join the group and record delivery latency per message"""
+
+    async def run():
+        layer = build_layer(layer_config)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.put(channel)
+
+        latencies = []
+        while True:
+            message = await layer.receive(channel)
+            if message['type'] == 'check.stop':
+                break
+            latencies.append(time.time() - message['sent'])
+
+        await layer.group_discard(GROUP, channel)
+        results.put({'channel': channel, 'latencies': latencies})
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = "Check that the channel layer fans group messages out across processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of receiving processes (default: 4)')
+        parser.add_argument('--messages', type=int, default=200,
+                            help='Messages sent to the group (default: 200)')
+        parser.add_argument('--redis-url',
+                            help='Redis to test against instead of settings.CHANNEL_LAYERS')
+        parser.add_argument('--backend', default=DEFAULT_BACKEND,
+                            help='Channel layer class used with --redis-url or --spawn-redis')
+        parser.add_argument('--spawn-redis', action='store_true',
+                            help='Start a throwaway local redis-server for the check')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Seconds to wait for workers (default: 30)')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        redis_process = None
+        redis_url = options['redis_url']
+
+        if options['spawn_redis']:
+            redis_process, redis_url = self.spawn_redis()
+
+        try:
+            if redis_url:
+                layer_config = {
+                    'BACKEND': options['backend'],
+                    'CONFIG': {'hosts': [redis_url]},
+                }
+            else:
+                layer_config = settings.CHANNEL_LAYERS['default']
+                if layer_config['BACKEND'] == 'channels.layers.InMemoryChannelLayer':
+                    raise CommandError(
+                        "InMemoryChannelLayer cannot deliver across processes. "
+                        "Set REDIS_URL, or pass --redis-url or --spawn-redis."
+                    )
+
+            report = self.run_check(layer_config, options)
+        finally:
+            if redis_process is not None:
+                redis_process.terminate()
+                redis_process.wait()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(
+                f"{report['workers']} worker(s), {report['messages']} message(s) via {report['backend']}\n"
+                f"  delivered: {report['delivered']}/{report['expected']}\n"
+                f"  group_send ms  p50={report['group_send_ms']['p50']} "
+                f"p99={report['group_send_ms']['p99']}\n"
+                f"  delivery ms    p50={report['delivery_ms']['p50']} "
+                f"p95={report['delivery_ms']['p95']} p99={report['delivery_ms']['p99']}"
+            )
+
+        if report['delivered'] != report['expected']:
+            raise CommandError("Some workers did not receive every group message")
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS("Cross-process fan-out OK"))
+
+    def spawn_redis(self):
+        """Start redis-server on a free port; returns (process, url)"""
+        binary = shutil.which('redis-server')
+        if binary is None:
+            raise CommandError("redis-server was not found on PATH")
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        process = subprocess.Popen(
+            [binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                return process, f'redis://127.0.0.1:{port}/0'
+            except OSError:
+                time.sleep(0.05)
+
+        process.terminate()
+        raise CommandError("redis-server did not start listening in time")
+
+    def run_check(self, layer_config, options):
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        results = context.Queue()
+
+        workers = [
+            context.Process(target=worker_main, args=(layer_config, ready, results), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for _ in workers:
+                ready.get(timeout=options['timeout'])
+
+            send_latencies = asyncio.run(self.send_messages(layer_config, options['messages']))
+
+            reports = [results.get(timeout=options['timeout']) for _ in workers]
+        finally:
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+
+        delivery = [latency for report in reports for latency in report['latencies']]
+
+        return {
+            'backend': layer_config['BACKEND'],
+            'workers': len(workers),
+            'messages': options['messages'],
+            'expected': len(workers) * options['messages'],
+            'delivered': len(delivery),
+            'group_send_ms': {
+                'p50': percentile(send_latencies, 50),
+                'p99': percentile(send_latencies, 99),
+            },
+            'delivery_ms': {
+                'p50': percentile(delivery, 50),
+                'p95': percentile(delivery, 95),
+                'p99': percentile(delivery, 99),
+            },
+        }
+
+    async def send_messages(self, layer_config, count):
+        layer = build_layer(layer_config)
+        latencies = []
+
+        for seq in range(count):
+            started = time.perf_counter()
+            await layer.group_send(GROUP, {'type': 'check.ping', 'seq': seq, 'sent': time.time()})
+            latencies.append(time.perf_counter() - started)
+
+        await layer.group_send(GROUP, {'type': 'check.stop'})
+        return latencies
@@ -0,0 +1,458 @@
+"""
+Management command: load-test the chat WebSocket consumers
+
+Creates N rooms with M sockets each, sends messages at a target rate and
+reports connect latency, end-to-end delivery latency percentiles, database
+writes per second and memory growth.
+
+In-process mode (default) drives the consumers through
+channels.testing.WebsocketCommunicator against a throwaway file-backed
+test database, with the per-socket rate limits lifted. Out-of-process mode
+(--url) connects to a running daphne with real WebSockets; it creates its
+users and sessions in the configured database and removes them afterwards.
+
+Usage:
+    python manage.py loadtest_chat --rooms 50 --clients 2 --rate 200 --duration 20
+    python manage.py loadtest_chat --endpoint user --json --output loadtest.json
+    python manage.py loadtest_chat --url ws://127.0.0.1:8000 --server-pid 4242
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from chat.management.commands.check_channel_layer import percentile
+
+
+USER_PREFIX = 'loadtest_'
+
+# Effectively unlimited flow control for in-process runs
+UNTHROTTLED = {
+    'CONNECTION_RATE': 1e9, 'CONNECTION_BURST': 1e9,
+    'USER_RATE': 1e9, 'USER_BURST': 1e9,
+    'SEND_QUEUE_SIZE': 100000, 'MAX_DROPPED': 10 ** 9,
+}
+
+
+def rss_bytes(pid='self'):
+    """Resident set size of a process from /proc, or None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def summary(values):
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': percentile(values, 100),
+    }
+
+
+class CommunicatorClient:
+    """In-process socket driving the consumer application directly"""
+
+    def __init__(self, application, path, user):
+        from channels.testing import WebsocketCommunicator
+
+        self.communicator = WebsocketCommunicator(application, path)
+        self.communicator.scope['user'] = user
+
+    async def connect(self, timeout):
+        connected, _ = await self.communicator.connect(timeout=timeout)
+        return connected
+
+    async def send(self, text):
+        await self.communicator.send_to(text_data=text)
+
+    async def receive(self, timeout):
+        """Next text frame, or None once the socket has closed"""
+        output = await self.communicator.receive_output(timeout=timeout)
+        if output['type'] == 'websocket.close':
+            return None
+        return output.get('text')
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteClient:
+    """
+    Minimal RFC 6455 client on asyncio streams for a running server
+    (autobahn can't be used here: the daphne app pins txaio to twisted)
+    """
+
+    def __init__(self, url, cookie):
+        self.url = urlparse(url)
+        self.cookie = cookie
+        self.reader = self.writer = None
+
+    async def connect(self, timeout):
+        host, port = self.url.hostname, self.url.port or 80
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write((
+            f"GET {self.url.path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            f"Origin: http://{host}:{port}\r\n"
+            f"Cookie: {self.cookie}\r\n\r\n"
+        ).encode())
+        response = await asyncio.wait_for(self.reader.readuntil(b'\r\n\r\n'), timeout)
+        return response.split(b' ', 2)[1] == b'101'
+
+    async def send(self, text, opcode=0x1):
+        payload = text.encode('utf-8') if isinstance(text, str) else text
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 2 ** 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+
+        # Client frames must be masked
+        mask = os.urandom(4)
+        repeated = (mask * (length // 4 + 1))[:length]
+        masked = (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(length, 'big')
+        self.writer.write(header + mask + masked)
+        await self.writer.drain()
+
+    async def receive(self, timeout):
+        """Next text frame, or None once the socket has closed"""
+        while True:
+            try:
+                first, second = await asyncio.wait_for(self.reader.readexactly(2), timeout)
+                length = second & 0x7f
+                if length == 126:
+                    length, = struct.unpack('!H', await self.reader.readexactly(2))
+                elif length == 127:
+                    length, = struct.unpack('!Q', await self.reader.readexactly(8))
+                payload = await self.reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                return None
+
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                await self.send(payload, opcode=0xA)
+            elif opcode == 0x1:
+                return payload.decode('utf-8')
+
+    async def close(self):
+        if self.writer is not None:
+            await self.send(struct.pack('!H', 1000), opcode=0x8)
+            self.writer.close()
+
+
+class Command(BaseCommand):
+    help = "Load-test the chat WebSocket consumers and report latency, DB writes and memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10,
+                            help='Number of chat rooms (default: 10)')
+        parser.add_argument('--clients', type=int, default=2,
+                            help='Sockets per room, alternating between its two participants (default: 2)')
+        parser.add_argument('--rate', type=float, default=50,
+                            help='Target messages per second across all clients (default: 50)')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds to send for (default: 10)')
+        parser.add_argument('--drain', type=float, default=2,
+                            help='Seconds to wait for in-flight deliveries afterwards (default: 2)')
+        parser.add_argument('--endpoint', choices=['chat', 'user'], default='chat',
+                            help='ChatConsumer (ws/chat/<room>/) or the multiplexed UserConsumer (ws/user/)')
+        parser.add_argument('--url',
+                            help='Base ws:// URL of a running server; runs out of process')
+        parser.add_argument('--server-pid', type=int,
+                            help='Server process to sample memory from in --url mode')
+        parser.add_argument('--keep-limits', action='store_true',
+                            help='Keep CHAT_FLOW_CONTROL rate limits for in-process runs')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+        parser.add_argument('--output',
+                            help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['rooms'] < 1 or options['clients'] < 2:
+            raise CommandError("Need at least one room and two clients per room")
+
+        if options['url']:
+            report = self.run_remote(options)
+        else:
+            report = self.run_in_process(options)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def run_in_process(self, options):
+        from channels.routing import URLRouter
+        from chat.buffer import get_message_buffer, write_behind_enabled
+        from chat.routing import websocket_urlpatterns
+
+        # A file-backed test database, so writes cost what they would on disk
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.mkdtemp(prefix='loadtest_chat_')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0)
+
+        flow_control = getattr(settings, 'CHAT_FLOW_CONTROL', {})
+        if not options['keep_limits']:
+            flow_control = dict(flow_control, **UNTHROTTLED)
+
+        try:
+            with override_settings(CHAT_FLOW_CONTROL=flow_control):
+                rooms = self.create_rooms(options['rooms'])
+                application = URLRouter(websocket_urlpatterns)
+
+                def make_client(room, user):
+                    return CommunicatorClient(application, self.socket_path(options, room), user)
+
+                async def flush():
+                    if write_behind_enabled():
+                        await get_message_buffer().flush()
+
+                report = asyncio.run(self.run_load(rooms, make_client, flush, options, 'self'))
+                if write_behind_enabled():
+                    report['write_buffer'] = get_message_buffer().stats()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        report['mode'] = 'in-process'
+        return report
+
+    def run_remote(self, options):
+        from django.contrib.sessions.backends.db import SessionStore
+        from accounts.models import User
+
+        rooms = self.create_rooms(options['rooms'])
+        base_url = options['url'].rstrip('/')
+
+        cookies = {}
+        for room in rooms:
+            for user in (room.participant1, room.participant2):
+                session = SessionStore()
+                session[SESSION_KEY] = str(user.pk)
+                session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+                session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+                session.save()
+                cookies[user.id] = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+        def make_client(room, user):
+            return RemoteClient(base_url + '/' + self.socket_path(options, room), cookies[user.id])
+
+        async def flush():
+            # The server's write-behind buffer flushes on its own interval
+            await asyncio.sleep(1)
+
+        try:
+            report = asyncio.run(self.run_load(rooms, make_client, flush, options, options['server_pid']))
+        finally:
+            User.objects.filter(username__startswith=self.run_prefix).delete()
+            SessionStore.clear_expired()
+
+        report['mode'] = 'out-of-process'
+        report['url'] = base_url
+        return report
+
+    def socket_path(self, options, room):
+        if options['endpoint'] == 'user':
+            return 'ws/user/'
+        return f'ws/chat/{room.id}/'
+
+    def create_rooms(self, count):
+        """Two fresh users per room, created in bulk"""
+        from accounts.models import User
+        from chat.models import ChatRoom
+
+        self.run_prefix = f'{USER_PREFIX}{int(time.time())}_'
+        users = User.objects.bulk_create([
+            User(
+                username=f'{self.run_prefix}{index}',
+                email=f'{self.run_prefix}{index}@loadtest.invalid',
+                role='donor',
+                password='!',
+            )
+            for index in range(count * 2)
+        ])
+        return ChatRoom.objects.bulk_create([
+            ChatRoom(participant1=users[index * 2], participant2=users[index * 2 + 1])
+            for index in range(count)
+        ])
+
+    async def run_load(self, rooms, make_client, flush, options, pid):
+        from chat.models import Message
+
+        clients_per_room = options['clients']
+        timeout = options['duration'] + options['drain'] + 30
+        rss_start = rss_bytes(pid) if pid else None
+
+        # Connect every socket, timing the handshake
+        clients = []
+        connect_latencies = []
+        connect_failures = 0
+        for room in rooms:
+            for index in range(clients_per_room):
+                user = room.participant1 if index % 2 == 0 else room.participant2
+                client = make_client(room, user)
+                started = time.perf_counter()
+                try:
+                    connected = await client.connect(timeout=10)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+                    connected = False
+                if not connected:
+                    connect_failures += 1
+                    continue
+                connect_latencies.append(time.perf_counter() - started)
+                clients.append((len(clients), room, client))
+
+        if not clients:
+            raise CommandError("No client could connect")
+
+        delivery_latencies = []
+        counters = {'sent': 0, 'received': 0, 'rate_limited': 0, 'closed': 0}
+
+        async def read(client_id, client):
+            while True:
+                try:
+                    text = await client.receive(timeout=timeout)
+                except asyncio.TimeoutError:
+                    return
+                if text is None:
+                    counters['closed'] += 1
+                    return
+                frame = json.loads(text)
+                if 'rate_limited' in text or frame.get('stream') == 'error':
+                    counters['rate_limited'] += 1
+                    continue
+                message = frame.get('data', frame).get('message', '')
+                if not message.startswith('lt '):
+                    continue
+                _, sender, sent = message.split(' ', 2)
+                if int(sender) != client_id:
+                    counters['received'] += 1
+                    delivery_latencies.append(time.perf_counter() - float(sent))
+
+        async def write(client_id, room, client, interval, deadline):
+            next_send = time.perf_counter() + random.uniform(0, interval)
+            while next_send < deadline:
+                await asyncio.sleep(max(0, next_send - time.perf_counter()))
+                text = f'lt {client_id} {time.perf_counter()}'
+                if options['endpoint'] == 'user':
+                    frame = {'action': 'send', 'room': room.id, 'message': text}
+                else:
+                    frame = {'message': text}
+                await client.send(json.dumps(frame))
+                counters['sent'] += 1
+                next_send += interval
+
+        readers = [asyncio.ensure_future(read(client_id, client)) for client_id, _, client in clients]
+
+        # Spread the target rate evenly over every socket
+        interval = len(clients) / options['rate']
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        await asyncio.gather(*[
+            write(client_id, room, client, interval, deadline)
+            for client_id, room, client in clients
+        ])
+        send_elapsed = time.perf_counter() - started
+
+        await asyncio.sleep(options['drain'])
+        await flush()
+
+        for reader in readers:
+            reader.cancel()
+        for _, _, client in clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+        persisted = await sync_to_async(
+            Message.objects.filter(room__in=[room.id for room in rooms]).count
+        )()
+        rss_end = rss_bytes(pid) if pid else None
+
+        expected = counters['sent'] * (clients_per_room - 1)
+        return {
+            'endpoint': options['endpoint'],
+            'rooms': len(rooms),
+            'clients_per_room': clients_per_room,
+            'connected': len(clients),
+            'connect_failures': connect_failures,
+            'target_rate': options['rate'],
+            'duration_s': round(send_elapsed, 3),
+            'messages_sent': counters['sent'],
+            'send_rate': round(counters['sent'] / send_elapsed, 1) if send_elapsed else 0,
+            'deliveries_expected': expected,
+            'deliveries_received': counters['received'],
+            'rate_limited_frames': counters['rate_limited'],
+            'sockets_closed_by_server': counters['closed'],
+            'connect_ms': summary(connect_latencies),
+            'delivery_ms': summary(delivery_latencies),
+            'db_rows_written': persisted,
+            'db_writes_per_s': round(persisted / send_elapsed, 1) if send_elapsed else 0,
+            'rss_start_mb': round(rss_start / 2 ** 20, 1) if rss_start else None,
+            'rss_end_mb': round(rss_end / 2 ** 20, 1) if rss_end else None,
+            'rss_growth_mb': round((rss_end - rss_start) / 2 ** 20, 1) if rss_start and rss_end else None,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['mode']} {report['endpoint']} endpoint: {report['rooms']} room(s) x "
+            f"{report['clients_per_room']} client(s), {report['connected']} connected"
+            f"{', ' + str(report['connect_failures']) + ' failed' if report['connect_failures'] else ''}\n"
+            f"  sent          {report['messages_sent']} in {report['duration_s']}s "
+            f"({report['send_rate']}/s, target {report['target_rate']}/s)\n"
+            f"  delivered     {report['deliveries_received']}/{report['deliveries_expected']}"
+            f"{'  rate-limited: ' + str(report['rate_limited_frames']) if report['rate_limited_frames'] else ''}\n"
+            f"  connect ms    p50={report['connect_ms']['p50']} p95={report['connect_ms']['p95']} "
+            f"p99={report['connect_ms']['p99']}\n"
+            f"  delivery ms   p50={report['delivery_ms']['p50']} p95={report['delivery_ms']['p95']} "
+            f"p99={report['delivery_ms']['p99']} max={report['delivery_ms']['max']}\n"
+            f"  db writes     {report['db_rows_written']} rows ({report['db_writes_per_s']}/s)"
+        )
+        if 'write_buffer' in report:
+            buffer = report['write_buffer']
+            self.stdout.write(
+                f"  write buffer  {buffer['batches']} batch(es), largest {buffer['largest_batch']}, "
+                f"retries {buffer['retries']}, dropped {buffer['dropped']}"
+            )
+        if report['rss_growth_mb'] is not None:
+            self.stdout.write(
+                f"  memory        {report['rss_start_mb']} -> {report['rss_end_mb']} MB "
+                f"(+{report['rss_growth_mb']} MB)"
+            )
@@ -0,0 +1,45 @@
+"""
+Management command: rebuild the chat message search index
+
+Recreates the index structures if they are missing (SQLite drops the sync
+triggers whenever a migration rebuilds chat_message) and reindexes every
+message.
+
+Usage:
+    python manage.py rebuild_message_index
+    python manage.py rebuild_message_index --check "blood donation"
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.models import Message
+from chat.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text index over chat messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', metavar='QUERY',
+                            help='After rebuilding, count index matches for QUERY')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Rebuilding message index with {type(backend).__name__}...")
+
+        started = time.monotonic()
+        indexed = backend.rebuild()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} message(s) in {elapsed:.2f}s"
+        ))
+
+        if options['check']:
+            started = time.monotonic()
+            matches = backend.filter_queryset(Message.objects.all(), options['check']).count()
+            self.stdout.write(
+                f"{matches} message(s) match {options['check']!r} "
+                f"({(time.monotonic() - started) * 1000:.1f} ms)"
+            )
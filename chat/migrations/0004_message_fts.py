@@ -0,0 +1,54 @@
+# Full-text index over chat messages (SQLite FTS5, see chat/search.py)
+
+from django.db import migrations
+
+
+# Frozen copy of chat.search.fts_install_sql('chat_message_fts', 'chat_message');
+# rebuild_message_index runs that function, so the two must stay identical
+FTS_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(
+        content, room_id, content='chat_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_ai AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_ad AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content, room_id)
+        VALUES ('delete', old.id, old.content, old.room_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_au AFTER UPDATE OF content, room_id ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, content, room_id)
+        VALUES ('delete', old.id, old.content, old.room_id);
+        INSERT INTO chat_message_fts(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END""",
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def operation(apps, schema_editor):
+        # Other databases supply their own index through CHAT_SEARCH_BACKEND
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_room_ts_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(FTS_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_messagearchive'),
+    ]
+
+    # Only the Python-side default changes; altering the column on SQLite
+    # would rebuild chat_message and drop the FTS sync triggers (0004)
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='timestamp',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,10 @@
 """
 Chat models: ChatRoom and Message for real-time messaging
 """
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from accounts.models import User
 
 
@@ -11,6 +14,18 @@ class ChatRoom(models.Model):
     """
     participant1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chatrooms_as_participant1')
     participant2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chatrooms_as_participant2')
+    
+    # Denormalized last message, kept in step with inserts by post_message()
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    
+    # Unread message counters per participant
+    participant1_unread = models.PositiveIntegerField(default=0)
+    participant2_unread = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -40,6 +55,75 @@ class ChatRoom(models.Model):
         if self.participant1 == user:
             return self.participant2
         return self.participant1
+    
+    def _unread_field(self, user_id):
+        """Name of the unread counter column for the given participant"""
+        if self.participant1_id == user_id:
+            return 'participant1_unread'
+        return 'participant2_unread'
+    
+    def post_message(self, sender, receiver, content):
+        """
+        Create a message and update the room's last message and the
+        receiver's unread counter in the same transaction
+        """
+        with transaction.atomic():
+            message = Message.objects.create(
+                room=self,
+                sender=sender,
+                receiver=receiver,
+                content=content
+            )
+            ChatRoom.objects.filter(pk=self.pk).update(
+                last_message=message,
+                last_message_preview=content[:255],
+                last_message_at=message.timestamp,
+                updated_at=message.timestamp,
+                **{self._unread_field(receiver.id): F(self._unread_field(receiver.id)) + 1}
+            )
+        return message
+    
+    @classmethod
+    def post_messages(cls, messages):
+        """
+        Bulk-insert unsaved Message objects and update each affected room's
+        last message and unread counters, all in one transaction.
+        Issues one INSERT plus one UPDATE per distinct room.
+        """
+        if not messages:
+            return []
+        
+        with transaction.atomic():
+            created = Message.objects.bulk_create(messages)
+            
+            rooms = cls.objects.only('id', 'participant1_id', 'participant2_id').in_bulk(
+                {message.room_id for message in created}
+            )
+            
+            # Latest message and unread increments per room
+            latest = {}
+            unread = {}
+            for message in created:
+                room = rooms[message.room_id]
+                latest[room.id] = message
+                counters = unread.setdefault(room.id, Counter())
+                counters[room._unread_field(message.receiver_id)] += 1
+            
+            for room_id, message in latest.items():
+                cls.objects.filter(pk=room_id).update(
+                    last_message=message,
+                    last_message_preview=message.content[:255],
+                    last_message_at=message.timestamp,
+                    updated_at=message.timestamp,
+                    **{field: F(field) + count for field, count in unread[room_id].items()}
+                )
+        return created
+    
+    def mark_read(self, user):
+        """Reset the unread counter for the given participant"""
+        if user.id not in (self.participant1_id, self.participant2_id):
+            return
+        ChatRoom.objects.filter(pk=self.pk).update(**{self._unread_field(user.id): 0})
 
 
 class Message(models.Model):
@@ -50,13 +134,43 @@ class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so buffered messages keep the time
+    # they were sent instead of the time their batch was written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['room', 'timestamp', 'id'], name='message_room_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username} -> {self.receiver.username}: {self.content[:50]}"
 
+
+class MessageArchive(models.Model):
+    """
+    A zlib-compressed JSON chunk of old messages from one room
+    Written by the archive_messages command; see chat/archive.py.
+    """
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='archives')
+    first_message_id = models.PositiveBigIntegerField()
+    last_message_id = models.PositiveBigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Message Archive'
+        verbose_name_plural = 'Message Archives'
+        indexes = [
+            models.Index(fields=['room', 'last_timestamp', 'last_message_id'], name='archive_room_ts_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Room {self.room_id}: {self.message_count} messages up to {self.last_timestamp:%Y-%m-%d}"
+
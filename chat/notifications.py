@@ -0,0 +1,53 @@
+"""
+Personal real-time notifications delivered over the per-user socket
+
+Each authenticated UserConsumer joins its user's group; anything sent with
+notify_user() reaches every open tab of that user.
+"""
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from lifelink.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_LAYER_SEND = histogram(
+    'lifelink_channel_layer_send_seconds', 'Time for a channel-layer group_send, by event type', ['type']
+)
+
+
+def user_group_name(user_id):
+    """Channel-layer group for one user's personal notifications"""
+    return f'user_{user_id}'
+
+
+async def group_send(channel_layer, group, event):
+    """channel_layer.group_send, timed into CHANNEL_LAYER_SEND"""
+    started = time.perf_counter()
+    await channel_layer.group_send(group, event)
+    CHANNEL_LAYER_SEND.labels(event['type']).observe(time.perf_counter() - started)
+
+
+def notify_user(user_id, kind, **data):
+    """
+    Push a notification to a user's open sockets (sync code only)
+
+    Usage:
+        notify_user(bank.user_id, 'inventory_low', blood_group='O-', units=3)
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(group_send)(
+            channel_layer,
+            user_group_name(user_id),
+            {'type': 'user_notification', 'kind': kind, 'data': data}
+        )
+    except Exception:
+        # A notification must never break the write that triggered it
+        logger.exception("Failed to send %s notification to user %s", kind, user_id)
@@ -0,0 +1,110 @@
+"""
+Presence (online / last seen) and typing state for chat, kept in the cache
+
+Nothing here touches the database. A user is online while the cache holds
+a count of their open sockets; sockets refresh it with a heartbeat, so a
+crashed process only leaves users "online" until ONLINE_TTL runs out.
+
+Settings (all optional):
+    CHAT_PRESENCE = {
+        'ONLINE_TTL': 60,        # seconds an online marker lives without a heartbeat
+        'TYPING_INTERVAL': 2,    # at most one typing broadcast per room and typist per interval
+    }
+"""
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+DEFAULTS = {
+    'ONLINE_TTL': 60,
+    'TYPING_INTERVAL': 2,
+}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'CHAT_PRESENCE', {}))
+
+
+def online_key(user_id):
+    return f'presence:online:{user_id}'
+
+
+def last_seen_key(user_id):
+    return f'presence:seen:{user_id}'
+
+
+def typing_key(room_id, user_id):
+    return f'presence:typing:{room_id}:{user_id}'
+
+
+def user_connected(user_id):
+    """Count a new socket for the user; True if they just came online"""
+    ttl = get_config()['ONLINE_TTL']
+    if cache.add(online_key(user_id), 1, ttl):
+        return True
+    try:
+        cache.incr(online_key(user_id))
+    except ValueError:
+        # Expired between add() and incr()
+        return cache.add(online_key(user_id), 1, ttl)
+    return False
+
+
+def user_disconnected(user_id):
+    """Drop one socket for the user; True if that was their last one"""
+    touch_last_seen(user_id)
+    try:
+        remaining = cache.decr(online_key(user_id))
+    except ValueError:
+        # Marker already expired, the user is offline either way
+        return True
+    if remaining <= 0:
+        cache.delete(online_key(user_id))
+        return True
+    return False
+
+
+def touch_last_seen(user_id):
+    """Record now as the user's last-seen time; returns the epoch timestamp"""
+    now = time.time()
+    cache.set(last_seen_key(user_id), now, None)
+    return now
+
+
+def heartbeat(user_id):
+    """Keep the user's online marker alive; True if it had expired and was restored"""
+    if cache.touch(online_key(user_id), get_config()['ONLINE_TTL']):
+        return False
+    return cache.add(online_key(user_id), 1, get_config()['ONLINE_TTL'])
+
+
+def get_presence(user_ids):
+    """
+    Presence for several users in one cache round trip
+    Returns {user_id: {'online': bool, 'last_seen': aware datetime or None}}
+    """
+    keys = {}
+    for user_id in user_ids:
+        keys[online_key(user_id)] = user_id
+        keys[last_seen_key(user_id)] = user_id
+    found = cache.get_many(keys)
+
+    presence = {}
+    for user_id in user_ids:
+        last_seen = found.get(last_seen_key(user_id))
+        presence[user_id] = {
+            'online': online_key(user_id) in found,
+            'last_seen': datetime.fromtimestamp(last_seen, tz=timezone.utc) if last_seen else None,
+        }
+    return presence
+
+
+def should_broadcast_typing(room_id, user_id):
+    """
+    Coalesce typing events: only the first one per TYPING_INTERVAL is broadcast
+    cache.add is atomic, so this holds across processes with a shared cache.
+    """
+    return cache.add(typing_key(room_id, user_id), 1, get_config()['TYPING_INTERVAL'])
@@ -0,0 +1,193 @@
+"""
+Wire formats for the chat WebSockets, negotiated by subprotocol at connect
+
+Clients that ask for no subprotocol get the original verbose JSON frames.
+A client listing one of the subprotocols below gets compact frames instead:
+one-letter keys, no usernames on every message, and a sender-id -> username
+table sent once per session (new senders carry their name the first time).
+
+    lifelink.compact.v1   compact frames as JSON text
+    lifelink.msgpack.v1   the same frames as msgpack binary (client frames
+                          may be msgpack too); offered when msgpack is installed
+
+Compact server -> client frames:
+    {"t": "u", "u": {"12": "alice", ...}}          username table
+    {"t": "c", "r": room, "s": sender, "m": "..."}  chat message
+    {"t": "y", "r": room, "s": user}                typing
+    {"t": "p", "s": user, "o": 1, "l": last_seen}   presence
+    {"t": "n", "k": kind, "d": {...}}               notification
+    {"t": "e", "d": "detail"}                       error
+Any frame with "s" may also carry "n", the sender's username, the first
+time that sender appears in the session.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:  # optional; installed with channels_redis
+    msgpack = None
+
+
+class StreamCodec:
+    """Verbose JSON frames of UserConsumer (no subprotocol)"""
+
+    subprotocol = None
+    binary = False
+
+    def encode(self, frame):
+        return json.dumps(frame)
+
+    def decode(self, text_data=None, bytes_data=None):
+        """Parse a client frame; raises ValueError if it can't be decoded"""
+        if text_data is None:
+            raise ValueError("Binary frames need the msgpack subprotocol")
+        return json.loads(text_data)
+
+    def users(self, table):
+        """Username table for the start of a session, or None if not used"""
+        return None
+
+    def frame_dropped(self):
+        """The frame encoded last was never sent (the outbound queue was full)"""
+
+    def chat(self, room_id, sender_id, sender_username, message):
+        return self.encode({
+            'stream': 'chat',
+            'room': room_id,
+            'data': {
+                'message': message,
+                'sender_id': sender_id,
+                'sender_username': sender_username,
+            },
+        })
+
+    def typing(self, room_id, user_id, username):
+        return self.encode({
+            'stream': 'typing',
+            'room': room_id,
+            'data': {'user_id': user_id, 'username': username},
+        })
+
+    def presence(self, user_id, online, last_seen):
+        return self.encode({
+            'stream': 'presence',
+            'data': {'user_id': user_id, 'online': online, 'last_seen': last_seen},
+        })
+
+    def notification(self, kind, data):
+        return self.encode({'stream': 'notification', 'kind': kind, 'data': data})
+
+    def error(self, detail):
+        return self.encode({'stream': 'error', 'data': {'detail': detail}})
+
+
+class RoomCodec(StreamCodec):
+    """Verbose JSON frames of the single-room ChatConsumer (no subprotocol)"""
+
+    def chat(self, room_id, sender_id, sender_username, message):
+        return self.encode({
+            'message': message,
+            'sender_id': sender_id,
+            'sender_username': sender_username,
+        })
+
+    def typing(self, room_id, user_id, username):
+        return self.encode({'typing': {'user_id': user_id, 'username': username}})
+
+    def presence(self, user_id, online, last_seen):
+        return self.encode({
+            'presence': {'user_id': user_id, 'online': online, 'last_seen': last_seen},
+        })
+
+    def error(self, detail):
+        return self.encode({'error': detail})
+
+
+class CompactCodec(StreamCodec):
+    """Short keys and a per-session username table, as JSON text"""
+
+    subprotocol = 'lifelink.compact.v1'
+
+    def __init__(self):
+        self.known_users = set()
+        # Senders named by the frame encoded last, until it is known to be sent
+        self.introduced = set()
+
+    def encode(self, frame):
+        return json.dumps(frame, separators=(',', ':'), ensure_ascii=False)
+
+    def with_sender(self, frame, user_id, username):
+        """Name a sender the first time they appear in this session"""
+        if user_id not in self.known_users:
+            self.known_users.add(user_id)
+            self.introduced = {user_id}
+            frame['n'] = username
+        return self.encode(frame)
+
+    def users(self, table):
+        self.introduced = set(table) - self.known_users
+        self.known_users.update(table)
+        return self.encode({'t': 'u', 'u': self.user_table(table)})
+
+    def frame_dropped(self):
+        # Forgetting too much only means a name is sent twice
+        self.known_users -= self.introduced
+        self.introduced = set()
+
+    def user_table(self, table):
+        # JSON object keys are strings
+        return {str(user_id): username for user_id, username in table.items()}
+
+    def chat(self, room_id, sender_id, sender_username, message):
+        return self.with_sender({'t': 'c', 'r': room_id, 's': sender_id, 'm': message}, sender_id, sender_username)
+
+    def typing(self, room_id, user_id, username):
+        return self.with_sender({'t': 'y', 'r': room_id, 's': user_id}, user_id, username)
+
+    def presence(self, user_id, online, last_seen):
+        frame = {'t': 'p', 's': user_id, 'o': int(online)}
+        if last_seen is not None:
+            frame['l'] = int(last_seen)
+        return self.encode(frame)
+
+    def notification(self, kind, data):
+        return self.encode({'t': 'n', 'k': kind, 'd': data})
+
+    def error(self, detail):
+        return self.encode({'t': 'e', 'd': detail})
+
+
+class MsgpackCodec(CompactCodec):
+    """Compact frames as msgpack binary"""
+
+    subprotocol = 'lifelink.msgpack.v1'
+    binary = True
+
+    def encode(self, frame):
+        return msgpack.packb(frame, use_bin_type=True)
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            return super().decode(text_data)
+        try:
+            return msgpack.unpackb(bytes_data, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack frame: {e}")
+
+    def user_table(self, table):
+        return dict(table)
+
+
+# Server preference order when a client offers several
+CODECS = [CompactCodec]
+if msgpack is not None:
+    CODECS.insert(0, MsgpackCodec)
+
+
+def negotiate(scope, default=StreamCodec):
+    """Pick a codec for the subprotocols the client offered"""
+    offered = scope.get('subprotocols') or []
+    for codec in CODECS:
+        if codec.subprotocol in offered:
+            return codec()
+    return default()
@@ -0,0 +1,248 @@
+"""
+Full-text search over chat messages
+
+The backend is chosen with settings.CHAT_SEARCH_BACKEND (a dotted path);
+left unset, SQLite gets SQLiteFTSBackend and other databases
+ContainsSearchBackend.
+SQLiteFTSBackend keeps an FTS5 external-content index over chat_message
+that SQLite triggers update on every insert, update and delete, so
+bulk_create and cascade deletes stay in sync without any Python hooks.
+Other databases can plug in their own backend; ContainsSearchBackend is a
+portable (unindexed) fallback.
+
+Rebuild the index with: python manage.py rebuild_message_index
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+
+from accounts.models import User
+from .models import ChatRoom, Message
+
+
+SNIPPET_TOKENS = 12
+
+# Private-use markers wrapped around matches, swapped for <mark> after escaping
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def highlight(snippet):
+    """Escape a snippet and turn match markers into <mark> tags"""
+    return escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+class SearchBackend:
+    """Interface for message search backends"""
+
+    def search(self, user, query, page=1, page_size=20):
+        """
+        Messages in the user's rooms matching query, best matches first
+        Returns (results, has_next); each result is a dict with id, room_id,
+        sender_id, sender_username, timestamp and an HTML-safe snippet.
+        """
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query):
+        """Restrict a Message queryset to matches (used by the admin)"""
+        raise NotImplementedError
+
+    def install(self):
+        """Create whatever index structures the backend needs (idempotent)"""
+
+    def rebuild(self):
+        """Rebuild the index from chat_message; returns the number of rows indexed"""
+        return Message.objects.count()
+
+
+class ContainsSearchBackend(SearchBackend):
+    """Portable fallback: case-insensitive substring match, newest first"""
+
+    def search(self, user, query, page=1, page_size=20):
+        query = query.strip()
+        if not query:
+            return [], False
+
+        offset = (page - 1) * page_size
+        rows = list(
+            self.filter_queryset(Message.objects.all(), query).filter(
+                room__in=user_rooms(user)
+            ).select_related('sender').order_by('-timestamp', '-id')[offset:offset + page_size + 1]
+        )
+
+        results = []
+        for message in rows[:page_size]:
+            results.append(result_dict(
+                message.id, message.room_id, message.sender_id, message.sender.username,
+                message.timestamp, highlight(self.snippet(message.content, query)),
+            ))
+        return results, len(rows) > page_size
+
+    def filter_queryset(self, queryset, query):
+        return queryset.filter(content__icontains=query)
+
+    def snippet(self, content, query):
+        """A window of text around the first match"""
+        position = content.lower().find(query.lower())
+        if position < 0:
+            return content[:80]
+        start = max(position - 40, 0)
+        end = position + len(query)
+        return (
+            ('…' if start else '')
+            + content[start:position]
+            + MATCH_START + content[position:end] + MATCH_END
+            + content[end:end + 40]
+            + ('…' if end + 40 < len(content) else '')
+        )
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 external-content index ranked with bm25
+
+    room_id is indexed alongside content so the restriction to the user's
+    rooms is applied inside the index, before anything is ranked.
+    """
+
+    table = 'chat_message_fts'
+
+    # Beyond this many rooms the room filter is applied in SQL instead
+    MAX_MATCH_ROOMS = 500
+
+    def match_expression(self, query):
+        """
+        Turn free text into a safe FTS5 query: every word must match and the
+        last one may be a prefix (search-as-you-type). Returns '' if there
+        are no words.
+        """
+        words = WORD_RE.findall(query)
+        if not words:
+            return ''
+        terms = ['"%s"' % word for word in words]
+        terms[-1] += '*'
+        return 'content:(%s)' % ' '.join(terms)
+
+    def search(self, user, query, page=1, page_size=20):
+        match = self.match_expression(query)
+        if not match:
+            return [], False
+
+        room_ids = list(user_rooms(user).values_list('id', flat=True))
+        if not room_ids:
+            return [], False
+
+        if len(room_ids) <= self.MAX_MATCH_ROOMS:
+            match += ' AND room_id:(%s)' % ' OR '.join(str(room_id) for room_id in room_ids)
+            room_filter = ''
+            room_params = []
+        else:
+            room_filter = 'AND m.room_id IN (%s)' % ', '.join(['%s'] * len(room_ids))
+            room_params = room_ids
+
+        offset = (page - 1) * page_size
+        sql = f"""
+            SELECT m.id, m.room_id, m.sender_id, m.timestamp,
+                   u.username AS sender_username,
+                   snippet({self.table}, 0, %s, %s, '…', %s) AS snippet
+            FROM {self.table}
+            JOIN {Message._meta.db_table} m ON m.id = {self.table}.rowid
+            JOIN {User._meta.db_table} u ON u.id = m.sender_id
+            WHERE {self.table} MATCH %s {room_filter}
+            ORDER BY bm25({self.table}, 1.0, 0.0), m.id DESC
+            LIMIT %s OFFSET %s
+        """
+        params = [MATCH_START, MATCH_END, SNIPPET_TOKENS, match, *room_params, page_size + 1, offset]
+
+        rows = list(Message.objects.raw(sql, params))
+
+        results = []
+        for message in rows[:page_size]:
+            results.append(result_dict(
+                message.id, message.room_id, message.sender_id, message.sender_username,
+                message.timestamp, highlight(message.snippet),
+            ))
+        return results, len(rows) > page_size
+
+    def filter_queryset(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match]
+        ))
+
+    def install(self):
+        with connection.cursor() as cursor:
+            for statement in fts_install_sql(self.table, Message._meta.db_table):
+                cursor.execute(statement)
+
+    def rebuild(self):
+        self.install()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+        return Message.objects.count()
+
+
+def fts_install_sql(fts_table, content_table):
+    """DDL for the FTS5 table and the triggers keeping it in sync with content_table"""
+    # chat/migrations/0004_message_fts.py holds a frozen copy of this output
+    # for chat_message; changing the index means a new migration, not an edit here
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+        content, room_id, content='{content_table}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN
+        INSERT INTO {fts_table}(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN
+        INSERT INTO {fts_table}({fts_table}, rowid, content, room_id)
+        VALUES ('delete', old.id, old.content, old.room_id);
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF content, room_id ON {content_table} BEGIN
+        INSERT INTO {fts_table}({fts_table}, rowid, content, room_id)
+        VALUES ('delete', old.id, old.content, old.room_id);
+        INSERT INTO {fts_table}(rowid, content, room_id) VALUES (new.id, new.content, new.room_id);
+    END""",
+    ]
+
+
+def user_rooms(user):
+    return ChatRoom.objects.filter(Q(participant1=user) | Q(participant2=user)).values('id')
+
+
+def result_dict(message_id, room_id, sender_id, sender_username, timestamp, snippet):
+    return {
+        'id': message_id,
+        'room_id': room_id,
+        'sender_id': sender_id,
+        'sender_username': sender_username,
+        'timestamp': timestamp,
+        'snippet': snippet,
+    }
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured backend; defaults to FTS5 on SQLite, substring search elsewhere"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'CHAT_SEARCH_BACKEND', None)
+        if path is None:
+            path = (
+                'chat.search.SQLiteFTSBackend' if connection.vendor == 'sqlite'
+                else 'chat.search.ContainsSearchBackend'
+            )
+        _backend = import_string(path)()
+    return _backend
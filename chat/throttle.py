@@ -0,0 +1,190 @@
+"""
+Flow control for chat WebSockets: rate limits, frame size limits and
+bounded outbound queues
+
+Settings (all optional):
+    CHAT_FLOW_CONTROL = {
+        'CONNECTION_RATE': 5,     # frames/second allowed per connection
+        'CONNECTION_BURST': 10,
+        'USER_RATE': 10,          # frames/second allowed per user, all connections
+        'USER_BURST': 20,
+        'MAX_FRAME_BYTES': 8192,  # larger frames close the socket before parsing
+        'SEND_QUEUE_SIZE': 100,   # outbound frames buffered per connection
+        'MAX_DROPPED': 50,        # a consumer that drops this many frames is closed
+    }
+"""
+import asyncio
+import time
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'CONNECTION_RATE': 5,
+    'CONNECTION_BURST': 10,
+    'USER_RATE': 10,
+    'USER_BURST': 20,
+    'MAX_FRAME_BYTES': 8192,
+    'SEND_QUEUE_SIZE': 100,
+    'MAX_DROPPED': 50,
+}
+
+# WebSocket close codes
+CLOSE_UNSUPPORTED = 1003
+CLOSE_TOO_BIG = 1009
+CLOSE_SLOW_CONSUMER = 4008
+
+# Process-wide counters
+metrics = {
+    'frames_accepted': 0,
+    'frames_throttled': 0,
+    'frames_oversized': 0,
+    'frames_binary': 0,
+    'outbound_dropped': 0,
+    'slow_consumers_closed': 0,
+}
+
+MAX_TRACKED_USERS = 10000
+_user_buckets = {}
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'CHAT_FLOW_CONTROL', {}))
+
+
+def frame_too_big(text_data, max_bytes):
+    """UTF-8 size check that only encodes frames near the limit"""
+    if len(text_data) > max_bytes:
+        return True
+    if len(text_data) * 4 <= max_bytes:
+        return False
+    return len(text_data.encode('utf-8')) > max_bytes
+
+
+def stats():
+    """Snapshot of the flow-control counters"""
+    return dict(metrics, tracked_users=len(_user_buckets))
+
+
+class TokenBucket:
+    """Classic token bucket: refills at rate tokens/second up to burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, tokens=1):
+        """Take tokens if available; returns False when the caller is over the limit"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+def get_user_bucket(user_id, rate, burst):
+    """Shared bucket for all of a user's connections in this process"""
+    bucket = _user_buckets.get(user_id)
+    if bucket is None:
+        if len(_user_buckets) >= MAX_TRACKED_USERS:
+            # Forget users whose bucket has refilled, they are idle
+            now = time.monotonic()
+            for idle_id in [
+                key for key, value in _user_buckets.items()
+                if value.tokens + (now - value.updated) * value.rate >= value.burst
+            ]:
+                del _user_buckets[idle_id]
+        bucket = _user_buckets[user_id] = TokenBucket(rate, burst)
+    return bucket
+
+
+class FlowControlMixin:
+    """
+    Mixin for AsyncWebsocketConsumer subclasses
+
+    Call start_flow_control() in connect(), stop_flow_control() in
+    disconnect(), check every incoming frame with admit_frame() and send
+    broadcast traffic through send_queued().
+    """
+
+    def start_flow_control(self):
+        config = get_config()
+        self.flow_config = config
+        self.connection_bucket = TokenBucket(config['CONNECTION_RATE'], config['CONNECTION_BURST'])
+        self.user_bucket = get_user_bucket(self.user.id, config['USER_RATE'], config['USER_BURST'])
+        self.outbound = asyncio.Queue(maxsize=config['SEND_QUEUE_SIZE'])
+        self.dropped_frames = 0
+        self.writer_task = asyncio.ensure_future(self._drain_outbound())
+
+    async def stop_flow_control(self):
+        writer = getattr(self, 'writer_task', None)
+        if writer is not None:
+            writer.cancel()
+
+    def binary_frames_allowed(self):
+        """Override to accept binary client frames"""
+        return False
+
+    async def admit_frame(self, text_data, bytes_data=None):
+        """
+        Decide whether an incoming frame may be processed
+        Unexpected binary and oversized frames close the socket; throttled
+        frames are dropped.
+        """
+        if text_data is None:
+            if bytes_data is None or not self.binary_frames_allowed():
+                metrics['frames_binary'] += 1
+                await self.close(code=CLOSE_UNSUPPORTED)
+                return False
+            too_big = len(bytes_data) > self.flow_config['MAX_FRAME_BYTES']
+        else:
+            too_big = frame_too_big(text_data, self.flow_config['MAX_FRAME_BYTES'])
+
+        if too_big:
+            metrics['frames_oversized'] += 1
+            await self.close(code=CLOSE_TOO_BIG)
+            return False
+
+        # Check both buckets so a throttled connection doesn't drain the user bucket
+        if not self.connection_bucket.consume() or not self.user_bucket.consume():
+            metrics['frames_throttled'] += 1
+            await self.send_queued(self.throttled_frame())
+            return False
+
+        metrics['frames_accepted'] += 1
+        return True
+
+    def outbound_frame_dropped(self):
+        """Override to react to the frame just passed to send_queued() being dropped"""
+
+    def throttled_frame(self):
+        """Frame sent back when a client is rate limited"""
+        return '{"error": "rate_limited"}'
+
+    async def send_queued(self, data):
+        """
+        Queue an outbound frame (str for text, bytes for binary); slow
+        consumers lose frames and are eventually closed
+        """
+        try:
+            self.outbound.put_nowait(data)
+        except asyncio.QueueFull:
+            metrics['outbound_dropped'] += 1
+            self.dropped_frames += 1
+            self.outbound_frame_dropped()
+            if self.dropped_frames == self.flow_config['MAX_DROPPED']:
+                metrics['slow_consumers_closed'] += 1
+                await self.close(code=CLOSE_SLOW_CONSUMER)
+
+    async def _drain_outbound(self):
+        while True:
+            data = await self.outbound.get()
+            if isinstance(data, bytes):
+                await self.send(bytes_data=data)
+            else:
+                await self.send(text_data=data)
@@ -9,5 +9,7 @@ app_name = 'chat'
 urlpatterns = [
     path('', views.chat_list, name='chat_list'),
     path('room/<int:user_id>/', views.chat_room, name='chat_room'),
+    path('history/<int:room_id>/', views.chat_history, name='chat_history'),
+    path('search/', views.chat_search, name='chat_search'),
 ]
 
@@ -1,33 +1,56 @@
 """
 Chat views: Chat room list and individual chat
 """
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Case, F, Q, When
 from accounts.decorators import role_required
-from .models import ChatRoom, Message
+from .archive import history_page
+from .models import ChatRoom
+from .notifications import notify_user
+from .presence import get_presence
+from .search import get_search_backend
 from accounts.models import User
+from lifelink.metrics import COUNT_BUCKETS, histogram
+
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+SEARCH_PAGE_SIZE = 20
+
+SEARCH_RESULTS = histogram(
+    'lifelink_chat_search_results', 'Messages on a chat search results page', buckets=COUNT_BUCKETS
+)
 
 
 @role_required(['donor', 'bloodbank', 'patient'])
 def chat_list(request):
     """List all chat rooms for the current user"""
-    # Get all chat rooms where user is a participant
+    # Last message preview and unread count live on the room itself,
+    # so the whole list is a single query
     chat_rooms = ChatRoom.objects.filter(
         Q(participant1=request.user) | Q(participant2=request.user)
-    ).select_related('participant1', 'participant2').order_by('-updated_at')
+    ).select_related('participant1', 'participant2').annotate(
+        unread_count=Case(
+            When(participant1=request.user, then=F('participant1_unread')),
+            default=F('participant2_unread'),
+        )
+    ).order_by('-updated_at')
     
-    # Get last message for each room
-    rooms_with_last_message = []
-    for room in chat_rooms:
-        last_message = Message.objects.filter(room=room).order_by('-timestamp').first()
-        other_user = room.get_other_participant(request.user)
-        
-        rooms_with_last_message.append({
+    rooms_with_last_message = [
+        {
             'room': room,
-            'other_user': other_user,
-            'last_message': last_message,
-        })
+            'other_user': room.get_other_participant(request.user),
+            'unread_count': room.unread_count,
+        }
+        for room in chat_rooms
+    ]
+    
+    # Presence comes from the cache in one round trip
+    presence = get_presence([item['other_user'].id for item in rooms_with_last_message])
+    for item in rooms_with_last_message:
+        item['online'] = presence[item['other_user'].id]['online']
     
     context = {
         'chat_rooms': rooms_with_last_message,
@@ -48,15 +71,101 @@ def chat_room(request, user_id):
     
     # Get or create chat room
     room, created = ChatRoom.get_or_create_room(request.user, other_user)
+    if created:
+        # Let the other user's open socket subscribe to the new room
+        notify_user(other_user.id, 'room_created', room_id=room.id, username=request.user.username)
+    room.mark_read(request.user)
     
-    # Get messages for this room
-    messages_list = Message.objects.filter(room=room).select_related('sender', 'receiver').order_by('timestamp')
+    # Only the most recent page is rendered; older pages come from chat_history
+    messages_list, history_cursor = history_page(room, page_size=HISTORY_PAGE_SIZE)
+    messages_list.reverse()
     
     context = {
         'room': room,
         'other_user': other_user,
-        'messages': messages_list,
+        'chat_messages': messages_list,
+        'history_cursor': history_cursor,
+        'other_presence': get_presence([other_user.id])[other_user.id],
     }
     
     return render(request, 'chat/chat_room.html', context)
 
+
+@role_required(['donor', 'bloodbank', 'patient'])
+def chat_history(request, room_id):
+    """
+    JSON page of older messages for a room, oldest first
+    Query params: cursor (from the previous page), limit
+    """
+    room = get_object_or_404(
+        ChatRoom.objects.filter(
+            Q(participant1=request.user) | Q(participant2=request.user)
+        ).select_related('participant1', 'participant2'),
+        id=room_id
+    )
+    
+    try:
+        limit = min(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    
+    # Past the hot table the page continues from archived chunks
+    messages_list, next_cursor = history_page(
+        room,
+        cursor=request.GET.get('cursor'),
+        page_size=max(limit, 1)
+    )
+    messages_list.reverse()
+    
+    # Both possible senders are the room's participants, no join needed
+    usernames = {
+        room.participant1_id: room.participant1.username,
+        room.participant2_id: room.participant2.username,
+    }
+    
+    return JsonResponse({
+        'messages': [
+            {
+                'id': message.id,
+                'message': message.content,
+                'sender_id': message.sender_id,
+                'sender_username': usernames.get(message.sender_id, ''),
+                'timestamp': message.timestamp.isoformat(),
+            }
+            for message in messages_list
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+@role_required(['donor', 'bloodbank', 'patient'])
+def chat_search(request):
+    """Search the messages of the current user's chat rooms"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    
+    results, has_next = [], False
+    if query:
+        results, has_next = get_search_backend().search(
+            request.user, query, page=page, page_size=SEARCH_PAGE_SIZE
+        )
+        SEARCH_RESULTS.observe(len(results))
+        
+        # Link each hit to its conversation, one query for all rooms on the page
+        rooms = ChatRoom.objects.select_related('participant1', 'participant2').in_bulk(
+            {result['room_id'] for result in results}
+        )
+        for result in results:
+            result['other_user'] = rooms[result['room_id']].get_other_participant(request.user)
+    
+    context = {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+    }
+    
+    return render(request, 'chat/search.html', context)
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donors', '0002_donorprofile_address_donorprofile_gender_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donationschedule',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('missed', 'Missed')], default='scheduled', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='donationschedule',
+            index=models.Index(fields=['status', 'scheduled_date'], name='donation_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbanks', '0003_bloodbank_description_bloodbank_emergency_contact_and_more'),
+        ('donors', '0003_donationschedule_missed_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donationschedule',
+            index=models.Index(fields=['blood_bank', 'status', 'scheduled_date', 'id'], name='donation_bank_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donationschedule',
+            index=models.Index(fields=['donor', 'scheduled_date', 'id'], name='donation_donor_date_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    DonorProfile = apps.get_model('donors', 'DonorProfile')
+
+    missing = User.objects.filter(role='donor', donor_profile__isnull=True)
+    DonorProfile.objects.bulk_create(
+        [DonorProfile(user=user, blood_group='O+') for user in missing.iterator()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_email'),
+        ('donors', '0004_donationschedule_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donors', '0005_backfill_donor_profiles'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donationschedule',
+            index=models.Index(fields=['donor', 'status', 'scheduled_date'], name='donation_donor_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donorprofile',
+            index=models.Index(fields=['blood_group', 'availability'], name='donor_group_avail_idx'),
+        ),
+    ]
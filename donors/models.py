@@ -37,6 +37,9 @@ class DonorProfile(models.Model):
     class Meta:
         verbose_name = 'Donor Profile'
         verbose_name_plural = 'Donor Profiles'
+        indexes = [
+            models.Index(fields=['blood_group', 'availability'], name='donor_group_avail_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.blood_group}"
@@ -86,6 +89,7 @@ class DonationSchedule(models.Model):
         ('scheduled', 'Scheduled'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('missed', 'Missed'),
     ]
     
     donor = models.ForeignKey(DonorProfile, on_delete=models.CASCADE, related_name='scheduled_donations')
@@ -101,6 +105,12 @@ class DonationSchedule(models.Model):
         verbose_name = 'Donation Schedule'
         verbose_name_plural = 'Donation Schedules'
         ordering = ['-scheduled_date']
+        indexes = [
+            models.Index(fields=['status', 'scheduled_date'], name='donation_status_date_idx'),
+            models.Index(fields=['blood_bank', 'status', 'scheduled_date', 'id'], name='donation_bank_status_date_idx'),
+            models.Index(fields=['donor', 'scheduled_date', 'id'], name='donation_donor_date_idx'),
+            models.Index(fields=['donor', 'status', 'scheduled_date'], name='donation_donor_status_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.donor.user.username} -> {self.blood_bank.user.username} on {self.scheduled_date.date()}"
@@ -141,3 +151,82 @@ class DonationSchedule(models.Model):
         inventory.units += 1
         inventory.save()
 
+
+    @classmethod
+    def mark_completed_bulk(cls, blood_bank, schedule_ids):
+        """
+        Mark many scheduled donations as completed in one transaction.
+
+        Uses a fixed number of grouped UPDATE statements (schedules, donors,
+        inventory) regardless of how many ids are passed in.
+        Returns the number of donations completed.
+        """
+        from collections import Counter
+        from django.db import transaction
+        from django.db.models import Case, F, When
+        from django.utils import timezone
+        from bloodbanks.cache import invalidate_dashboard
+        from bloodbanks.models import BloodInventory
+        from bloodbanks.signals import send_schedule_changed
+
+        now = timezone.now()
+
+        with transaction.atomic():
+            rows = list(
+                cls.objects.select_for_update()
+                .filter(id__in=schedule_ids, blood_bank=blood_bank, status='scheduled')
+                .values_list('id', 'donor_id', 'donor__blood_group', 'donor__user_id', 'scheduled_date')
+            )
+            if not rows:
+                return 0
+
+            cls.objects.filter(id__in=[row[0] for row in rows]).update(
+                status='completed',
+                updated_at=now
+            )
+
+            # A donor may appear more than once in a batch, so increment by count
+            donor_counts = Counter(row[1] for row in rows)
+            DonorProfile.objects.filter(id__in=donor_counts).update(
+                last_donation_date=date.today(),
+                total_donations=Case(
+                    *[When(id=donor_id, then=F('total_donations') + count)
+                      for donor_id, count in donor_counts.items()],
+                    default=F('total_donations'),
+                    output_field=models.PositiveIntegerField()
+                ),
+                updated_at=now
+            )
+
+            # Make sure an inventory row exists for every blood group, then add units
+            group_counts = Counter(row[2] for row in rows)
+            BloodInventory.objects.bulk_create(
+                [BloodInventory(blood_bank=blood_bank, blood_group=group, units=0)
+                 for group in group_counts],
+                ignore_conflicts=True
+            )
+            BloodInventory.objects.filter(
+                blood_bank=blood_bank,
+                blood_group__in=group_counts
+            ).update(
+                units=Case(
+                    *[When(blood_group=group, then=F('units') + count)
+                      for group, count in group_counts.items()],
+                    default=F('units'),
+                    output_field=models.PositiveIntegerField()
+                ),
+                last_updated=now
+            )
+
+            # update() skips post_save, so drop the cached dashboard and
+            # notify the donors and the bank explicitly
+            def after_commit():
+                invalidate_dashboard(blood_bank.id)
+                for schedule_id, _, _, donor_user_id, scheduled_date in rows:
+                    send_schedule_changed(
+                        (donor_user_id, blood_bank.user_id), schedule_id, 'completed', scheduled_date
+                    )
+
+            transaction.on_commit(after_commit)
+
+        return len(rows)
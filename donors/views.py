@@ -10,22 +10,20 @@ from django.utils import timezone
 
 from accounts.decorators import donor_required
 from accounts.models import User
-from .models import DonorProfile, DonationSchedule
+from .models import DonationSchedule
 from bloodbanks.models import BloodBank
 from accounts.utils import get_nearby_users
+from accounts.pagination import keyset_paginate
+
+
+HISTORY_PAGE_SIZE = 20
 
 
 @donor_required
 def dashboard(request):
     """Donor dashboard"""
 
-    donor_profile, created = DonorProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'age': 18,
-            'blood_group': 'O+'
-        }
-    )
+    donor_profile = request.profile
 
     upcoming_donations = DonationSchedule.objects.filter(
         donor=donor_profile,
@@ -59,7 +57,7 @@ def dashboard(request):
 def profile(request):
     """Donor profile view and edit"""
 
-    donor_profile = DonorProfile.objects.get(user=request.user)
+    donor_profile = request.profile
 
     if request.method == 'POST':
         age = request.POST.get('age')
@@ -88,7 +86,7 @@ def profile(request):
 def toggle_availability(request):
     """Toggle donor availability"""
 
-    donor_profile = DonorProfile.objects.get(user=request.user)
+    donor_profile = request.profile
     donor_profile.availability = not donor_profile.availability
     donor_profile.save()
 
@@ -196,7 +194,7 @@ def toggle_availability(request):
 def schedule_donation(request):
     """Schedule donation with nearby blood banks"""
 
-    donor_profile = DonorProfile.objects.get(user=request.user)
+    donor_profile = request.profile
 
     eligible, eligibility_message = donor_profile.is_eligible()
     if not eligible:
@@ -204,9 +202,11 @@ def schedule_donation(request):
         return redirect('donors:dashboard')
 
     # ❌ BLOCK if already has an active scheduled donation
+    # (past-due schedules are left to the expire_schedules command)
     if DonationSchedule.objects.filter(
         donor=donor_profile,
-        status='scheduled'
+        status='scheduled',
+        scheduled_date__gte=timezone.now()
     ).exists():
         messages.error(
             request,
@@ -230,24 +230,22 @@ def schedule_donation(request):
             )
             return redirect('donors:dashboard')
 
-    # Get nearby blood banks
-    blood_bank_users = User.objects.filter(role='bloodbank')
+    # Get nearby blood banks, profiles joined in rather than fetched one by one
+    blood_bank_users = User.objects.filter(role='bloodbank').select_related('blood_bank_profile')
     nearby_blood_bank_users = get_nearby_users(
         request.user,
         blood_bank_users,
         max_distance_km=100
     )
 
-    blood_banks = []
-    for user in nearby_blood_bank_users:
-        try:
-            blood_bank = BloodBank.objects.get(user=user)
-            blood_banks.append({
-                'blood_bank': blood_bank,
-                'distance': user.distance_km
-            })
-        except BloodBank.DoesNotExist:
-            continue
+    blood_banks = [
+        {
+            'blood_bank': user.blood_bank_profile,
+            'distance': user.distance_km
+        }
+        for user in nearby_blood_bank_users
+        if hasattr(user, 'blood_bank_profile')
+    ]
 
     if request.method == 'POST':
         blood_bank_id = request.POST.get('blood_bank')
@@ -310,12 +308,39 @@ def schedule_donation(request):
         context
     )
 
+@donor_required
+def donation_history(request):
+    """Full donation history, newest first, one keyset page at a time"""
+
+    donor_profile = request.profile
+
+    cursor = request.GET.get('cursor')
+    donations, next_cursor = keyset_paginate(
+        DonationSchedule.objects.filter(
+            donor=donor_profile
+        ).select_related('blood_bank', 'blood_bank__user'),
+        'scheduled_date',
+        cursor=cursor,
+        page_size=HISTORY_PAGE_SIZE,
+        descending=True
+    )
+
+    context = {
+        'donor_profile': donor_profile,
+        'donations': donations,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+    }
+
+    return render(request, 'donors/history.html', context)
+
+
 @donor_required
 def cancel_donation(request, schedule_id):
     """Cancel a scheduled donation"""
 
     schedule = get_object_or_404(
-        DonationSchedule,
+        DonationSchedule.objects.select_related('donor', 'blood_bank'),
         id=schedule_id,
         donor__user=request.user
     )
@@ -0,0 +1,510 @@
+"""
+Process metrics in the Prometheus text format
+
+A small registry of counters and histograms, cheap enough to update on
+every request and WebSocket frame (a dict lookup and a float add under a
+lock). Modules declare what they measure at import time:
+
+    from lifelink.metrics import counter, histogram
+
+    CONNECTIONS = counter('lifelink_chat_connections_total', 'Accepted sockets', ['consumer'])
+    CONNECTIONS.labels('chat').inc()
+
+and MetricsMiddleware records latency, status and query count for every
+request by URL name. The process-wide stats() counters of other modules
+(STATS_SOURCES) are exported alongside, as lifelink_<source>_<key>.
+
+Everything is served at /metrics/ to staff users, or to a scraper that
+sends "Authorization: Bearer <TOKEN>".
+
+With several gunicorn / daphne workers each process only sees its own
+numbers. Set MULTIPROCESS_DIR to a directory shared by the workers (and
+emptied when the service starts): each process then keeps its values in
+an mmap'ed file there, <pid>.db, and a scrape sums the files of all
+processes. Counters and histograms of exited workers are kept so totals
+never go backwards; gauges only count live processes.
+
+Settings (all optional):
+    METRICS = {
+        'ENABLED': True,           # MetricsMiddleware removes itself when off
+        'TOKEN': '',               # bearer token for scrapers; staff can always read
+        'MULTIPROCESS_DIR': None,  # shared directory for per-process files
+        'SYNC_INTERVAL': 5,        # seconds between copies of stats() into that file
+    }
+"""
+import bisect
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.cache import never_cache
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TOKEN': '',
+    'MULTIPROCESS_DIR': None,
+    'SYNC_INTERVAL': 5,
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# stats() functions exported with every scrape; keys not listed in
+# GAUGE_STATS are counters
+STATS_SOURCES = {
+    'chat_flow': 'chat.throttle.stats',
+    'chat_write_buffer': 'chat.buffer.stats',
+    'location': 'accounts.location.stats',
+    'profiling': 'lifelink.profiling.stats',
+}
+
+# Point-in-time values and how to combine them across processes
+GAUGE_STATS = {
+    'tracked_users': 'sum',
+    'pending': 'sum',
+    'max_pending': 'max',
+    'largest_batch': 'max',
+    'last_flush_ms': 'max',
+}
+
+# Per-process file layout: a 4-byte "bytes used" header, then entries of
+# a 4-byte key length, the UTF-8 key padded to 8 bytes and an 8-byte double
+INITIAL_FILE_SIZE = 64 * 1024
+HEADER = struct.Struct('i')
+KEY_LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'METRICS', {}))
+
+
+def padded(length):
+    return length + (-length % 8)
+
+
+class MemoryStore:
+    """Values of this process only"""
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def items(self):
+        return list(self._values.items())
+
+
+class MmapStore:
+    """
+    Values of this process in <directory>/<pid>.db, readable by any process.
+    Only the owning process writes; a new entry is published by bumping the
+    header last, so readers never see half an entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size < INITIAL_FILE_SIZE:
+                os.ftruncate(fd, INITIAL_FILE_SIZE)
+            self._map = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        self._positions = {}
+        self._used = HEADER.unpack_from(self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            HEADER.pack_into(self._map, 0, self._used)
+        for key, value, position in parse_entries(self._map, self._used):
+            self._positions[key] = position
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode('utf-8')
+            size = KEY_LENGTH.size + padded(len(encoded)) + VALUE.size
+            if self._used + size > len(self._map):
+                self._map.resize(max(len(self._map) * 2, self._used + size))
+            KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+            self._map[self._used + KEY_LENGTH.size:self._used + KEY_LENGTH.size + len(encoded)] = encoded
+            position = self._used + KEY_LENGTH.size + padded(len(encoded))
+            VALUE.pack_into(self._map, position, 0.0)
+            self._used += size
+            HEADER.pack_into(self._map, 0, self._used)
+            self._positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self._position(key)
+        VALUE.pack_into(self._map, position, VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def set(self, key, value):
+        VALUE.pack_into(self._map, self._position(key), value)
+
+    def items(self):
+        return [(key, value) for key, value, _ in parse_entries(self._map, self._used)]
+
+
+def parse_entries(data, used):
+    """(key, value, value offset) for every entry of a per-process file"""
+    offset = 8
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        start = offset + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode('utf-8')
+        position = start + padded(length)
+        yield key, VALUE.unpack_from(data, position)[0], position
+        offset = position + VALUE.size
+
+
+def read_file(path):
+    """Entries of another process's file, read without mapping it"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return []
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    return [(key, value) for key, value, _ in parse_entries(data, used)]
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sample_key(family, kind, mode, name, labels):
+    """Store key of one sample; self-describing so any process can expose it"""
+    return json.dumps([family, kind, mode, name, labels], separators=(',', ':'))
+
+
+class Registry:
+    """Metric families of this process and the store holding their values"""
+
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+        self._store = None
+        self._store_pid = None
+        self._synced = 0.0
+
+    @property
+    def store(self):
+        # A forked worker must not write into its parent's file
+        if self._store_pid != os.getpid():
+            directory = get_config()['MULTIPROCESS_DIR']
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self._store = MmapStore(os.path.join(str(directory), f'{os.getpid()}.db'))
+            else:
+                self._store = MemoryStore()
+            self._store_pid = os.getpid()
+        return self._store
+
+    def register(self, family):
+        existing = self.families.get(family.name)
+        if existing is not None:
+            if type(existing) is not type(family) or existing.labelnames != family.labelnames:
+                raise ValueError(f"Metric {family.name} is already registered differently")
+            return existing
+        self.families[family.name] = family
+        return family
+
+    def add(self, key, amount):
+        with self.lock:
+            self.store.add(key, amount)
+
+    def sync_stats(self):
+        """Copy the stats() counters of STATS_SOURCES into the store"""
+        self._synced = time.monotonic()
+        for source, path in STATS_SOURCES.items():
+            try:
+                values = import_string(path)()
+            except ImportError:
+                continue
+            with self.lock:
+                for key, value in values.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    mode = GAUGE_STATS.get(key)
+                    if mode:
+                        family = f'lifelink_{source}_{key}'
+                        self.store.set(sample_key(family, 'gauge', mode, family, {}), float(value))
+                    else:
+                        family = f'lifelink_{source}_{key}_total'
+                        self.store.set(sample_key(family, 'counter', 'sum', family, {}), float(value))
+
+    def tick(self):
+        """Sync the stats() counters now and then; called on hot paths, so cheap when not due"""
+        if time.monotonic() - self._synced >= get_config()['SYNC_INTERVAL']:
+            self.sync_stats()
+
+    def collect(self):
+        """{family: (kind, {(name, labels): value})} summed over every process"""
+        self.sync_stats()
+        directory = get_config()['MULTIPROCESS_DIR']
+        if directory:
+            self.store  # make sure this process has a file too
+            sources = []
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith('.db'):
+                    continue
+                pid = int(filename[:-3]) if filename[:-3].isdigit() else None
+                alive = pid is not None and process_alive(pid)
+                try:
+                    sources.append((alive, read_file(os.path.join(str(directory), filename))))
+                except OSError:
+                    continue
+        else:
+            with self.lock:
+                sources = [(True, self.store.items())]
+
+        families = {}
+        for alive, entries in sources:
+            for key, value in entries:
+                family, kind, mode, name, labels = json.loads(key)
+                if kind == 'gauge' and not alive:
+                    continue
+                samples = families.setdefault(family, (kind, {}))[1]
+                sample = (name, tuple(labels.items()))
+                if mode == 'max':
+                    samples[sample] = max(samples.get(sample, value), value)
+                else:
+                    samples[sample] = samples.get(sample, 0.0) + value
+        return families
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for family, (kind, samples) in sorted(self.collect().items()):
+            registered = self.families.get(family)
+            if registered is not None:
+                lines.append(f'# HELP {family} {escape_help(registered.documentation)}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                lines.extend(histogram_lines(samples))
+            else:
+                for (name, labels), value in sorted(samples.items()):
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(str(value))}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+def histogram_lines(samples):
+    """Cumulative _bucket lines, then _sum and _count, for every label set"""
+    series = {}
+    for (name, labels), value in samples.items():
+        labels = dict(labels)
+        le = labels.pop('le', None)
+        entry = series.setdefault((name.rsplit('_', 1)[0], tuple(labels.items())), {'buckets': {}})
+        if le is not None:
+            entry['buckets'][float(le)] = value
+        else:
+            entry[name.rsplit('_', 1)[1]] = value
+
+    lines = []
+    for (base, labels), entry in sorted(series.items()):
+        cumulative = 0.0
+        for bound in sorted(entry['buckets']):
+            cumulative += entry['buckets'][bound]
+            le = '+Inf' if bound == float('inf') else format_value(bound)
+            lines.append(f'{base}_bucket{format_labels(labels + (("le", le),))} {format_value(cumulative)}')
+        lines.append(f'{base}_sum{format_labels(labels)} {format_value(entry.get("sum", 0.0))}')
+        lines.append(f'{base}_count{format_labels(labels)} {format_value(entry.get("count", 0.0))}')
+    return lines
+
+
+registry = Registry()
+
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            labels = dict(zip(self.labelnames, map(str, values)))
+            child = self._children[values] = CounterChild(
+                sample_key(self.name, 'counter', 'sum', self.name, labels)
+            )
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class CounterChild:
+    def __init__(self, key):
+        self.key = key
+
+    def inc(self, amount=1):
+        registry.add(self.key, amount)
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            labels = dict(zip(self.labelnames, map(str, values)))
+            child = self._children[values] = HistogramChild(self, labels)
+        return child
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class HistogramChild:
+    def __init__(self, histogram, labels):
+        name = histogram.name
+        self.bounds = histogram.buckets
+        self.bucket_keys = [
+            sample_key(name, 'histogram', 'sum', f'{name}_bucket', dict(labels, le=repr(bound)))
+            for bound in self.bounds
+        ]
+        self.sum_key = sample_key(name, 'histogram', 'sum', f'{name}_sum', labels)
+        self.count_key = sample_key(name, 'histogram', 'sum', f'{name}_count', labels)
+        # Every bucket is exposed, including the empty ones
+        for key in self.bucket_keys + [self.sum_key, self.count_key]:
+            registry.add(key, 0)
+
+    def observe(self, value):
+        bucket = self.bucket_keys[bisect.bisect_left(self.bounds, value)]
+        with registry.lock:
+            store = registry.store
+            store.add(bucket, 1)
+            store.add(self.sum_key, value)
+            store.add(self.count_key, 1)
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+REQUESTS = counter(
+    'lifelink_http_requests_total', 'HTTP responses by URL name, method and status', ['view', 'method', 'status']
+)
+REQUEST_LATENCY = histogram(
+    'lifelink_http_request_duration_seconds', 'Time to produce a response, by URL name', ['view', 'method']
+)
+REQUEST_QUERIES = histogram(
+    'lifelink_http_request_db_queries', 'SQL queries per request, by URL name', ['view'], buckets=COUNT_BUCKETS
+)
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook that only counts"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Latency, status and query count of every request, by URL name"""
+
+    def __init__(self, get_response):
+        if not get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        registry.tick()
+        return response
+
+
+def authorized(request):
+    """Staff users, or a scraper presenting the configured bearer token"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = get_config()['TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)
+
+
+@never_cache
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    if not authorized(request):
+        response = HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+        if get_config()['TOKEN']:
+            response.status_code = 401
+            response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
@@ -0,0 +1,259 @@
+"""
+Opt-in request profiling: Server-Timing headers and a slow log
+
+ProfilingMiddleware samples a fraction of requests. For a sampled request
+it counts every SQL query and its time through connection.execute_wrapper,
+times the view and template rendering, and reports them in a Server-Timing
+header (shown per request in the browser's network panel):
+
+    Server-Timing: db;dur=4.1;desc="7 queries", tpl;dur=2.3, view;dur=9.8, total;dur=11.2
+
+Requests slower than SLOW_REQUEST_MS, and queries slower than
+SLOW_QUERY_MS, are written to the 'lifelink.profiling' logger together
+with their SQL and the project code they came from. With LOG_FILE set
+that logger gets a rotating file of its own.
+
+Requests that are not sampled only have their total time taken, so slow
+ones are still logged (without query details). Keep SAMPLE_RATE low in
+production; the wrapper adds a few microseconds per query.
+
+"view" runs from URL resolution to the response leaving the inner
+middleware, so it includes template rendering and the view's own queries.
+
+Settings (all optional):
+    PROFILING = {
+        'ENABLED': False,          # the middleware removes itself when off
+        'SAMPLE_RATE': 0.05,       # fraction of requests profiled
+        'SERVER_TIMING': True,     # add the header to sampled responses
+        'SLOW_REQUEST_MS': 500,
+        'SLOW_QUERY_MS': 100,
+        'LOG_FILE': None,          # e.g. BASE_DIR / 'logs' / 'slow.log'
+        'LOG_MAX_BYTES': 5 * 1024 * 1024,
+        'LOG_BACKUP_COUNT': 5,
+        'SLOWEST_QUERIES': 5,      # queries listed for a slow request
+    }
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.05,
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_MS': 100,
+    'LOG_FILE': None,
+    'LOG_MAX_BYTES': 5 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+    'SLOWEST_QUERIES': 5,
+}
+
+# Frames from these files are never reported as the origin of a query:
+# the standard library, installed packages and the project's own middleware
+SKIPPED_FILES = (
+    os.path.dirname(os.__file__),
+    os.sep + 'site-packages' + os.sep,
+    __file__,
+    os.path.join(os.path.dirname(__file__), 'metrics.py'),
+)
+
+# Process-wide counters
+metrics = {
+    'requests_seen': 0,
+    'requests_sampled': 0,
+    'slow_requests': 0,
+    'slow_queries': 0,
+}
+
+# The profile of the request being handled by this thread, if it is sampled
+_local = threading.local()
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'PROFILING', {}))
+
+
+def stats():
+    """Snapshot of the profiling counters"""
+    return dict(metrics)
+
+
+def query_origin(depth=3):
+    """The innermost project frames on the current stack, as 'path:line in function'"""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    origin = []
+    frame = sys._getframe(1)
+    while frame is not None and len(origin) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not any(skip in filename for skip in SKIPPED_FILES):
+            origin.append(
+                f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return origin
+
+
+class RequestProfile:
+    """Timings collected for one sampled request"""
+
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.view_started = None
+        self.view_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook: time one query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries.append((duration, sql, query_origin()))
+
+    def server_timing(self, total):
+        """Value of the Server-Timing header"""
+        entries = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        if self.view_time is not None:
+            entries.append(f'view;dur={self.view_time * 1000:.1f}')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def install_template_timer():
+    """Time Template.render for the sampled request, counting nested includes once"""
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    def timed_render(self, context):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return render(self, context)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+
+    timed_render.profiled = True
+    Template.render = timed_render
+
+
+def configure_log_file(config):
+    """Send the slow log to its own rotating file"""
+    path = str(config['LOG_FILE'])
+    if any(getattr(handler, 'baseFilename', None) == os.path.abspath(path) for handler in logger.handlers):
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=config['LOG_MAX_BYTES'],
+        backupCount=config['LOG_BACKUP_COUNT'],
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class ProfilingMiddleware:
+    """
+    Samples requests for the Server-Timing header and the slow log.
+    Put it first in MIDDLEWARE so the total covers every other middleware.
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.server_timing = config['SERVER_TIMING']
+        self.slow_request = config['SLOW_REQUEST_MS'] / 1000
+        self.slow_query = config['SLOW_QUERY_MS'] / 1000
+        self.slowest_queries = config['SLOWEST_QUERIES']
+        install_template_timer()
+        if config['LOG_FILE']:
+            configure_log_file(config)
+
+    def __call__(self, request):
+        metrics['requests_seen'] += 1
+        if random.random() >= self.sample_rate:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            total = time.perf_counter() - started
+            if total >= self.slow_request:
+                metrics['slow_requests'] += 1
+                logger.warning(
+                    "Slow request %s %s -> %s in %.0fms (not sampled)",
+                    request.method, request.path, response.status_code, total * 1000
+                )
+            return response
+
+        metrics['requests_sampled'] += 1
+        profile = RequestProfile()
+        request._profile = profile
+        _local.profile = profile
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = time.perf_counter() - started
+        if profile.view_started is not None:
+            profile.view_time = time.perf_counter() - profile.view_started
+
+        if self.server_timing:
+            response['Server-Timing'] = profile.server_timing(total)
+        self.log_slow(request, response, profile, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def log_slow(self, request, response, profile, total):
+        """Write slow queries, and the slowest queries of a slow request"""
+        slow_queries = [query for query in profile.queries if query[0] >= self.slow_query]
+        metrics['slow_queries'] += len(slow_queries)
+        for duration, sql, origin in slow_queries:
+            logger.warning(
+                "Slow query %.0fms during %s %s\n    %s\n    from %s",
+                duration * 1000, request.method, request.path, sql, ' <- '.join(origin) or 'unknown'
+            )
+
+        if total < self.slow_request:
+            return
+        metrics['slow_requests'] += 1
+        lines = [
+            f"Slow request {request.method} {request.path} -> {response.status_code} in {total * 1000:.0f}ms: "
+            f"{len(profile.queries)} queries in {profile.db_time * 1000:.0f}ms, "
+            f"templates {profile.template_time * 1000:.0f}ms"
+        ]
+        for duration, sql, origin in sorted(profile.queries, key=lambda query: query[0], reverse=True)[:self.slowest_queries]:
+            lines.append(f"    {duration * 1000:.1f}ms  {sql}\n        from {' <- '.join(origin) or 'unknown'}")
+        logger.warning('\n'.join(lines))
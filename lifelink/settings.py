@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lifelink.profiling.ProfilingMiddleware',
+    'lifelink.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +77,119 @@ TEMPLATES = [
 WSGI_APPLICATION = 'lifelink.wsgi.application'
 ASGI_APPLICATION = 'lifelink.asgi.application'
 
+# Redis (optional): set REDIS_URL to share the channel layer and cache
+# between processes, e.g. REDIS_URL=redis://127.0.0.1:6379/0
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
 # Django Channels Configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
+# Without Redis, chat only works inside a single process (one daphne worker)
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            # channels_redis.pubsub.RedisPubSubChannelLayer is also supported
+            'BACKEND': os.environ.get(
+                'CHANNEL_LAYER_BACKEND', 'channels_redis.core.RedisChannelLayer'
+            ),
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Chat messages are broadcast first and written in batches ('write_behind');
+# use 'sync' to insert each message before it is broadcast
+CHAT_MESSAGE_WRITE_MODE = 'write_behind'
+CHAT_WRITE_BUFFER = {
+    'MAX_BATCH': 100,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_PENDING': 5000,
+    'MAX_RETRIES': 5,
+}
+
+# Per-socket rate limits and outbound backpressure (see chat/throttle.py)
+CHAT_FLOW_CONTROL = {
+    'CONNECTION_RATE': 5,
+    'CONNECTION_BURST': 10,
+    'USER_RATE': 10,
+    'USER_BURST': 20,
+    'MAX_FRAME_BYTES': 8192,
+    'SEND_QUEUE_SIZE': 100,
+    'MAX_DROPPED': 50,
 }
 
+# Presence and typing indicators, kept in the cache (see chat/presence.py)
+CHAT_PRESENCE = {
+    'ONLINE_TTL': 60,
+    'TYPING_INTERVAL': 2,
+}
+
+# Message search backend (see chat/search.py). Unset, it is FTS5 on SQLite
+# and substring search elsewhere; set a dotted path to override
+# CHAT_SEARCH_BACKEND = 'chat.search.SQLiteFTSBackend'
+
+# Messages older than this move to compressed archive chunks (see chat/archive.py)
+CHAT_RETENTION = {
+    'ARCHIVE_AFTER_DAYS': 90,
+    'CHUNK_SIZE': 500,
+}
+
+# Offline place search / reverse geocoding for the location picker (see accounts/geocoder.py)
+GEOCODER = {
+    'CELL_DEGREES': 0.5,
+    'MAX_DISTANCE_KM': 50,
+    'MAX_RESULTS': 8,
+}
+
+# Reported positions are written only past this distance / interval (see accounts/location.py)
+LOCATION_UPDATES = {
+    'MIN_DISTANCE_KM': 0.5,
+    'MIN_INTERVAL': 60,
+}
+
+# Sampled request profiling: Server-Timing headers and a slow log (see lifelink/profiling.py);
+# off unless LIFELINK_PROFILING=1
+PROFILING = {
+    'ENABLED': os.environ.get('LIFELINK_PROFILING') == '1',
+    'SAMPLE_RATE': 0.05,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_MS': 100,
+    'LOG_FILE': BASE_DIR / 'logs' / 'slow.log',
+}
+
+
+# Prometheus metrics at /metrics/ for staff or a bearer token (see lifelink/metrics.py);
+# point LIFELINK_METRICS_DIR at a directory shared by all workers to aggregate them
+METRICS = {
+    'TOKEN': os.environ.get('LIFELINK_METRICS_TOKEN', ''),
+    'MULTIPROCESS_DIR': os.environ.get('LIFELINK_METRICS_DIR') or None,
+}
+
+
+
+# Cache (used for dashboard fragments)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Seconds a rendered blood bank dashboard fragment may be served from cache
+DASHBOARD_CACHE_TIMEOUT = 300
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -97,6 +205,13 @@ DATABASES = {
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Loads the role profile in the same query as the session user; ModelBackend
+# stays listed so sessions created before the switch remain valid
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,6 +251,17 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Content-hashed names plus .gz / .br copies, written by collectstatic and
+# served by lifelink.staticfiles.serve_static (see lifelink/staticfiles.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'lifelink.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -0,0 +1,173 @@
+"""
+Fingerprinted, pre-compressed static files served by the app itself
+
+collectstatic with CompressedManifestStaticFilesStorage copies every file
+under a content-hashed name (bootstrap.min.css -> bootstrap.min.3f9c.css,
+rewriting url() references in CSS) and then writes a gzip copy, plus a
+brotli copy when the brotli package is installed, next to each text asset
+worth compressing. Compression happens once at deploy time, at the
+highest level, instead of on every response.
+
+serve_static answers STATIC_URL requests from STATIC_ROOT:
+
+    - the smallest encoding the client accepts (br, then gzip, then the
+      file itself), with Vary: Accept-Encoding
+    - hashed names never change content, so they are cached for a year
+      as immutable and browsers don't even revalidate them
+    - other names (not from {% static %}) get a short max-age plus
+      Last-Modified / If-Modified-Since
+
+Fingerprinting only happens with DEBUG = False: with DEBUG on, Django's
+manifest storage makes {% static %} return the plain names (which the
+development server serves straight from STATICFILES_DIRS), so nothing
+gets the immutable headers. Deploy with DEBUG = False and run
+collectstatic first; without a manifest {% static %} raises instead of
+linking to files that are not there.
+
+Settings (all optional):
+    STATIC_PIPELINE = {
+        'MIN_SIZE': 256,             # smaller files are not compressed
+        'UNHASHED_MAX_AGE': 300,     # seconds, for names without a hash
+    }
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULTS = {
+    'MIN_SIZE': 256,
+    'UNHASHED_MAX_AGE': 300,
+}
+
+# Already compressed formats (images, fonts) gain nothing from another pass
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico'}
+
+# Preference order when the client accepts several
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def get_config():
+    return dict(DEFAULTS, **getattr(settings, 'STATIC_PIPELINE', {}))
+
+
+def compressible(name):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def compress(content):
+    """{suffix: compressed bytes} for every available encoding"""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz / .br copies of text assets"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        min_size = get_config()['MIN_SIZE']
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not compressible(name) or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                content = f.read()
+            if len(content) < min_size:
+                continue
+            for suffix, compressed in compress(content).items():
+                # Not worth a second request path if it barely shrinks
+                if len(compressed) < len(content) * 0.95:
+                    if self.exists(name + suffix):
+                        self.delete(name + suffix)
+                    self._save(name + suffix, ContentFile(compressed))
+
+
+_hashed_names = None
+
+
+def hashed_names():
+    """Every fingerprinted name in the manifest (empty before collectstatic)"""
+    global _hashed_names
+    if _hashed_names is None:
+        manifest = getattr(staticfiles_storage, 'hashed_files', {})
+        _hashed_names = frozenset(manifest.values())
+    return _hashed_names
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts, ignoring q=0"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """Serve a collected static file with the best encoding and cache headers"""
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    stat = os.stat(fullpath)
+    immutable = name in hashed_names()
+    if not immutable and not was_modified_since(
+        request.headers.get('If-Modified-Since'), stat.st_mtime
+    ):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(name)
+    served, encoding = fullpath, None
+    if compressible(name):
+        accepted = accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            if (coding in accepted or '*' in accepted) and os.path.isfile(fullpath + suffix):
+                served, encoding = fullpath + suffix, coding
+                break
+
+    response = FileResponse(
+        open(served, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+    )
+    # FileResponse names the download after the file it opened (maybe the
+    # .gz / .br copy); an asset is never a download
+    del response['Content-Disposition']
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if compressible(name):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response['Cache-Control'] = IMMUTABLE if immutable else f"public, max-age={get_config()['UNHASHED_MAX_AGE']}"
+    return response
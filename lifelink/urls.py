@@ -2,11 +2,14 @@
 URL configuration for lifelink project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from lifelink.metrics import metrics_view
+from lifelink.staticfiles import serve_static
+
 from django.conf.urls.static import static
 
 
@@ -34,6 +37,9 @@ urlpatterns = [
     path('bloodbank/', include('bloodbanks.urls')),
     path('patient/', include('patients.urls')),
     path('chat/', include('chat.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    # Collected assets; the development server answers these itself when DEBUG is on
+    re_path(r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'), serve_static, name='static'),
 ]
 
 if settings.DEBUG:
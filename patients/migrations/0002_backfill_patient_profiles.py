@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    PatientProfile = apps.get_model('patients', 'PatientProfile')
+
+    missing = User.objects.filter(role='patient', patient_profile__isnull=True)
+    PatientProfile.objects.bulk_create(
+        [PatientProfile(user=user, phone_number='', age=0) for user in missing.iterator()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_email'),
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
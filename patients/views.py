@@ -7,8 +7,14 @@ from accounts.decorators import patient_required
 from accounts.models import User
 from accounts.utils import get_nearby_users
 from donors.models import DonorProfile
-from bloodbanks.models import BloodBank, BloodInventory
-from .models import PatientProfile
+from bloodbanks.models import BloodInventory
+from lifelink.metrics import COUNT_BUCKETS, histogram
+
+
+SEARCH_RESULTS = histogram(
+    'lifelink_patient_search_results', 'Nearby donors or blood banks found by a patient search',
+    ['kind'], buckets=COUNT_BUCKETS
+)
 
 
 @patient_required
@@ -39,49 +45,49 @@ def search(request):
         if availability_only:
             donor_profiles = donor_profiles.filter(availability=True)
         
+        # Profiles are joined in, so the results need no query per donor
         donor_users = User.objects.filter(
             id__in=donor_profiles.values_list('user_id', flat=True)
-        )
+        ).select_related('donor_profile')
         
         nearby_donors = get_nearby_users(request.user, donor_users, max_distance_km=max_distance)
         
         for user in nearby_donors:
-            try:
-                donor_profile = DonorProfile.objects.get(user=user)
-                eligible, eligibility_msg = donor_profile.is_eligible()
-                
-                donors_results.append({
-                    'donor': donor_profile,
-                    'distance': user.distance_km,
-                    'eligible': eligible,
-                    'eligibility_msg': eligibility_msg,
-                })
-            except DonorProfile.DoesNotExist:
-                continue
+            donor_profile = user.donor_profile
+            eligible, eligibility_msg = donor_profile.is_eligible()
+            
+            donors_results.append({
+                'donor': donor_profile,
+                'distance': user.distance_km,
+                'eligible': eligible,
+                'eligibility_msg': eligibility_msg,
+            })
         
         # Search blood banks
-        blood_bank_users = User.objects.filter(role='bloodbank')
-        nearby_blood_banks = get_nearby_users(request.user, blood_bank_users, max_distance_km=max_distance)
+        blood_bank_users = User.objects.filter(role='bloodbank').select_related('blood_bank_profile')
+        nearby_blood_banks = [
+            user for user in get_nearby_users(request.user, blood_bank_users, max_distance_km=max_distance)
+            if hasattr(user, 'blood_bank_profile')
+        ]
+        
+        # Stock of the wanted group at every nearby bank, in one query
+        available_units = dict(
+            BloodInventory.objects.filter(
+                blood_bank__in=[user.blood_bank_profile for user in nearby_blood_banks],
+                blood_group=blood_group
+            ).values_list('blood_bank_id', 'units')
+        )
         
         for user in nearby_blood_banks:
-            try:
-                blood_bank = BloodBank.objects.get(user=user)
-                try:
-                    inventory = BloodInventory.objects.get(
-                        blood_bank=blood_bank,
-                        blood_group=blood_group
-                    )
-                    available_units = inventory.units
-                except BloodInventory.DoesNotExist:
-                    available_units = 0
-                
-                blood_banks_results.append({
-                    'blood_bank': blood_bank,
-                    'distance': user.distance_km,
-                    'available_units': available_units,
-                })
-            except BloodBank.DoesNotExist:
-                continue
+            blood_bank = user.blood_bank_profile
+            blood_banks_results.append({
+                'blood_bank': blood_bank,
+                'distance': user.distance_km,
+                'available_units': available_units.get(blood_bank.id, 0),
+            })
+        
+        SEARCH_RESULTS.labels('donors').observe(len(donors_results))
+        SEARCH_RESULTS.labels('blood_banks').observe(len(blood_banks_results))
     
     context = {
         'blood_group': blood_group,
@@ -100,14 +106,7 @@ def profile(request):
     Edit & Update Mode (POST)
     """
 
-    # Ensure patient profile exists
-    patient, created = PatientProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'phone_number': '',
-            'age': 0
-        }
-    )
+    patient = request.profile
 
     # UPDATE PROFILE
     if request.method == 'POST':